@@ -1,13 +1,16 @@
-from datetime import datetime
 from flask import Flask, render_template, request, url_for, redirect, flash, session, jsonify
 from flask_bcrypt import Bcrypt
 from functools import wraps
 import sqlite3
 import atexit
 from apscheduler.schedulers.background import BackgroundScheduler
-from classifier import analyze_with_gpt, build_prompt_from_revisions, get_user_revisions_diff, analyze_top_contributors
-from populate import init_db, fetch_revisions_from_api, update_database, rescrape_users
-from queries import count_users, fetch_users, fetch_revisions_db, fetch_articles
+from classifier import classify_user, build_prompt_from_revisions, get_user_revisions_diff, analyze_top_contributors
+from populate import init_db, populate_articles, rescrape_users, find_changed_articles
+from jobs import enqueue_job, get_job, start_workers
+from recentchanges import poll_recent_changes
+from ratelimit import request_priority, INTERACTIVE, NORMAL, BACKGROUND
+from queries import count_users, fetch_users, fetch_revisions_db, fetch_articles, fetch_user_revisions
+import hot_queries
 from itsdangerous import URLSafeTimedSerializer
 
 app = Flask(__name__)
@@ -63,30 +66,69 @@ def check_scheduled_population():
             )
         """).fetchall()
         
-        for article in articles:
-            try:
-                populate_article_now(article['title'])
-                print(f"Populated {article['title']} on schedule")
-            except Exception as e:
-                print(f"Error populating {article['title']}: {str(e)}")
-
-        # Rescrape old users
-        rescrape_users(conn)
-
-        # Analyse des top contributeurs
-        if datetime.now().hour == 3:
-            print("Analyzing top contributors...")
-            results = analyze_top_contributors()
-            print(f"Analyzed {len(results)} top contributors")
+        titles = [article['title'] for article in articles]
+        # Cheap prop=info probe first, most articles have no new edit
+        try:
+            changed = find_changed_articles(conn, titles)
+        except Exception as e:
+            print(f"Freshness probe failed, populating every due article: {str(e)}")
+            changed = set(titles)
+        unchanged = [title for title in titles if title not in changed]
+        conn.executemany(
+            "UPDATE scheduled_articles SET last_populated = datetime('now') WHERE title = ?",
+            [(title,) for title in unchanged]
+        )
+        conn.commit()
+        print(f"Skipped {len(unchanged)} unchanged articles")
+
+        # Fetched in parallel, written by a single connection
+        runs = populate_articles(DB_PATH, [title for title in titles if title in changed])
+        for title, run in runs.items():
+            if run['error']:
+                print(f"Error populating {title}: {run['error']}")
+            else:
+                print(f"Populated {title} on schedule")
+
+        with request_priority(BACKGROUND):
+            # Rescrape old users
+            rescrape_users(conn)
             
     finally:
         conn.close()
 
+def check_top_contributors():
+    """Analyse des top contributeurs, every night at 3 a.m."""
+    print("Analyzing top contributors...")
+    with request_priority(BACKGROUND):
+        results = analyze_top_contributors()
+    print(f"Analyzed {len(results)} top contributors")
+
+def check_recent_changes():
+    """Pull the edits made to tracked articles since the last poll"""
+    conn = get_conn()
+    try:
+        routed = poll_recent_changes(conn)
+        print(f"Recent changes: {routed} revisions of tracked articles")
+    except Exception as e:
+        print(f"Error polling recent changes: {str(e)}")
+    finally:
+        conn.close()
+
+# Make sure every table used by the background jobs exists
+init_db(DB_PATH)
+
 # Initialize scheduler
 scheduler = BackgroundScheduler()
 scheduler.add_job(check_scheduled_population, 'interval', hours=1)
+# The feed keeps tracked articles fresh between two scheduled populations
+scheduler.add_job(check_recent_changes, 'interval', minutes=5)
+# Own job: the classification run no longer delays the hourly population
+scheduler.add_job(check_top_contributors, 'cron', hour=3)
 scheduler.start()
 
+# Background population jobs queued by /populate and run_now
+start_workers(DB_PATH)
+
 # Shut down the scheduler when exiting the app
 atexit.register(lambda: scheduler.shutdown())
 
@@ -385,7 +427,8 @@ def toggle_admin(user_id):
 def admin_rescrape_users():
     try:
         conn = get_conn()
-        count = rescrape_users(conn)
+        with request_priority(BACKGROUND):
+            count = rescrape_users(conn)
         flash(f"Rescraped {count} user accounts", "success")
     except Exception as e:
         flash(f"Error rescraping users: {str(e)}", "error")
@@ -398,18 +441,20 @@ def admin_rescrape_users():
 @approved_required
 def articles():
     """Article list with precisions"""
-    page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 25, type=int)
     try:
         conn = get_conn()
         cursor = conn.cursor()
-        articles = fetch_articles(conn, limit=per_page, page=page)  # Pass conn to fetch_articles
+        articles, next_cursor, prev_cursor = fetch_articles(
+            conn, limit=per_page, cursor=request.args.get('cursor')
+        )
         cursor.execute("SELECT COUNT(*) FROM articles")
         total = cursor.fetchone()[0]
         return render_template('articles.html',
                             articles=articles,
-                            page=page,
                             per_page=per_page,
+                            next_cursor=next_cursor,
+                            prev_cursor=prev_cursor,
                             total=total)
     except Exception as e:
         flash(f"Error loading articles: {str(e)}", "error")
@@ -421,24 +466,22 @@ def articles():
 @login_required
 @approved_required
 def article_detail(title):
-    page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 25, type=int)
     try:
         conn = get_conn()
-        revisions = fetch_revisions_db(conn, article_title=title, limit=per_page, page=page)
+        revisions, next_cursor, prev_cursor = fetch_revisions_db(
+            conn, article_title=title, limit=per_page, cursor=request.args.get('cursor')
+        )
         # Get total count for pagination
         cur = conn.cursor()
-        cur.execute("""
-            SELECT COUNT(*) FROM revisions r
-            JOIN articles a ON a.id = r.article_id
-            WHERE a.title = ?
-        """, (title,))
+        cur.execute(hot_queries.ARTICLE_REVISION_COUNT, (title,))
         total = cur.fetchone()[0]
         return render_template('article_revisions.html', 
                              title=title, 
                              revisions=revisions,
-                             page=page,
                              per_page=per_page,
+                             next_cursor=next_cursor,
+                             prev_cursor=prev_cursor,
                              total=total)
     except Exception as e:
         flash(f"Error loading revisions: {str(e)}", "error")
@@ -453,7 +496,6 @@ def users_list():
     """Filterable user list with pagination"""
     try:
         conn = get_conn()
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 25, type=int)
         
         # Collect all filters
@@ -466,7 +508,7 @@ def users_list():
             'sort': request.args.get('sort', 'contributions') 
         }
         
-        users = fetch_users(
+        users, next_cursor, prev_cursor = fetch_users(
             conn,
             article_title=filters['article'],
             bots_only=filters['bots'] == '1',
@@ -474,7 +516,7 @@ def users_list():
             blocked_only=filters['blocked'] == '1',
             active_within_days=filters['active_days'],
             limit=per_page,
-            page=page,
+            cursor=request.args.get('cursor'),
             sort=filters['sort']
         )
         
@@ -491,9 +533,10 @@ def users_list():
                             users=users, 
                             filters=filters,
                             pagination={
-                                'page': page,
                                 'per_page': per_page,
-                                'total': total
+                                'total': total,
+                                'next_cursor': next_cursor,
+                                'prev_cursor': prev_cursor
                             })
     except Exception as e:
         flash(f"Error loading users: {str(e)}", "error")
@@ -501,9 +544,10 @@ def users_list():
                             users=[], 
                             filters=request.args,
                             pagination={
-                                'page': 1,
                                 'per_page': 25,
-                                'total': 0
+                                'total': 0,
+                                'next_cursor': None,
+                                'prev_cursor': None
                             })
     finally:
         if conn: conn.close()
@@ -517,16 +561,10 @@ def user_infos(username):
         cursor = conn.cursor()
         
         # Get pagination parameters
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 25, type=int)
-        offset = (page - 1) * per_page
         
         # Get user information
-        cursor.execute("""
-            SELECT id, username, is_ip, is_bot, is_blocked, classification 
-            FROM users 
-            WHERE username = ?
-        """, (username,))
+        cursor.execute(hot_queries.USER_BY_NAME, (username,))
         user = cursor.fetchone()
         
         if not user:
@@ -534,44 +572,24 @@ def user_infos(username):
             return redirect(url_for('index'))
         
         # Get user revisions with pagination
-        cursor.execute("""
-            SELECT r.revision_id, r.parent_id, r.timestamp, r.comment, 
-                   a.title as article_title, u.username
-            FROM revisions r
-            JOIN articles a ON a.id = r.article_id
-            JOIN users u ON u.id = r.user_id
-            WHERE u.username = ?
-            ORDER BY r.timestamp DESC
-            LIMIT ? OFFSET ?
-        """, (username, per_page, offset))
-        revisions = [dict(row) for row in cursor.fetchall()]
-        
-        # Get total count
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM revisions r
-            JOIN users u ON u.id = r.user_id
-            WHERE u.username = ?
-        """, (username,))
-        total = cursor.fetchone()[0]
+        revisions, next_cursor, prev_cursor = fetch_user_revisions(
+            conn, user['id'], limit=per_page, cursor=request.args.get('cursor')
+        )
+        revisions = [dict(row) for row in revisions]
         
-        # Get user statistics
-        cursor.execute("""
-            SELECT COUNT(DISTINCT article_id) as edited_articles_count,
-                   MIN(timestamp) as first_edit,
-                   MAX(timestamp) as last_edit
-            FROM revisions
-            WHERE user_id = ?
-        """, (user['id'],))
+        # Total and statistics, kept up to date by the triggers
+        cursor.execute(hot_queries.USER_STATS, (user['id'],))
         stats = dict(cursor.fetchone())
+        total = stats.pop('total')
         
         return render_template('user_revisions.html', 
                             user=dict(user),
                             revisions=revisions,
                             stats=stats,
                             total=total,
-                            page=page,
-                            per_page=per_page)
+                            per_page=per_page,
+                            next_cursor=next_cursor,
+                            prev_cursor=prev_cursor)
         
     except Exception as e:
         flash(f"Erreur lors du chargement des contributions: {str(e)}", "error")
@@ -603,19 +621,27 @@ def populate_db():
                 raise ValueError("Article title too long (max 200 chars)")
 
             conn = get_conn()
-            init_db(DB_PATH)
             
-            revisions = fetch_revisions_from_api(article)
-            update_database(conn, article, revisions)
+            # Queued for the background workers, or joined if already in flight
+            try:
+                job_id, created = enqueue_job(conn, article)
+            finally:
+                conn.close()
             
-            flash(f"Successfully added {len(revisions)} revisions for {article}!", "success")
-            return redirect(url_for('article_detail', title=article))
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'job_id': job_id, 'created': created}), 202
+            if created:
+                flash(f"Population of {article} queued (job #{job_id})", "success")
+            else:
+                flash(f"{article} is already being populated (job #{job_id})", "info")
+            return redirect(url_for('populate_db', job=job_id))
             
         except Exception as e:
             flash(f"Population error: {str(e)}", "error")
             return redirect(url_for('populate_db'))
     
-    return render_template('populate.html')
+    job_id = request.args.get('job', type=int)
+    return render_template('populate.html', job_id=job_id)
 
 @app.route('/populate/schedule', methods=['GET', 'POST'])
 @login_required
@@ -649,8 +675,12 @@ def populate_schedule():
                 flash("Schedule status updated", "success")
             elif action == 'run_now':
                 title = request.form.get('title')
-                populate_article_now(title)
-                flash(f"Manually populated {title}", "success")
+                # Nobody follows its progress, it yields to the /populate jobs
+                job_id, created = enqueue_job(conn, title, NORMAL)
+                if created:
+                    flash(f"Population of {title} queued (job #{job_id})", "success")
+                else:
+                    flash(f"{title} is already being populated (job #{job_id})", "info")
 
         # Get all scheduled articles
         scheduled = conn.execute(
@@ -661,17 +691,20 @@ def populate_schedule():
     finally:
         conn.close()
 
-def populate_article_now(title):
-    """Helper function to populate an article immediately"""
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+@approved_required
+def api_job(job_id):
+    """Progress of a population job"""
     conn = get_conn()
+    if not conn:
+        return jsonify({'error': 'Database unavailable'}), 500
     try:
-        revisions = fetch_revisions_from_api(title)
-        update_database(conn, title, revisions)
-        conn.execute(
-            "UPDATE scheduled_articles SET last_populated = datetime('now') WHERE title = ?",
-            (title,)
-        )
-        conn.commit()
+        job = get_job(conn, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        job['article_url'] = url_for('article_detail', title=job['title'])
+        return jsonify(job)
     finally:
         conn.close()
 
@@ -725,19 +758,11 @@ def api_search():
         
         # More efficient search with FTS if available
         # Search articles - using prefix search for better performance
-        cursor.execute('''
-            SELECT title FROM articles
-            WHERE LOWER(title) LIKE ? || '%'
-            LIMIT 50
-        ''', (query,))
+        cursor.execute(hot_queries.SEARCH_ARTICLES, (query + '%',))
         articles = [dict(row) for row in cursor.fetchall()]
         
-        # Search users - using prefix search
-        cursor.execute('''
-            SELECT username, is_bot, is_blocked FROM users
-            WHERE LOWER(username) LIKE ? || '%'
-            LIMIT 50
-        ''', (query,))
+        # Search users - using prefix search, on idx_users_username_nocase
+        cursor.execute(hot_queries.SEARCH_USERS, (query + '%',))
         users = [dict(row) for row in cursor.fetchall()]
         
         return jsonify({
@@ -755,19 +780,43 @@ def api_search():
 @approved_required
 @admin_required
 def classifier():
+    with request_priority(INTERACTIVE):
+        return _classifier_page()
+
+def _classify(username, revisions, prompt):
+    """classify_user, then copy the result to the user's row."""
+    conn = get_conn()
+    try:
+        analysis = classify_user(conn, username, revisions, prompt)
+    finally:
+        conn.close()
+    # Errors come back as a plain string, the stored classification is kept
+    if isinstance(analysis, tuple):
+        classification_update(username, analysis)
+    return analysis
+
+def _fetch_user_revisions_diff(username):
+    """get_user_revisions_diff, or None with a flashed message when the API fails."""
+    try:
+        return get_user_revisions_diff(username)
+    except Exception as e:
+        flash(f"Impossible de récupérer les contributions de {username}: {str(e)}", "error")
+        return None
+
+def _classifier_page():
     username = request.args.get('username', '') \
         if request.method == 'GET' else request.form.get('username', '').strip()
 
     if request.method == 'POST':
         action = request.form.get('action')
-        revisions = get_user_revisions_diff(username)
+        revisions = _fetch_user_revisions_diff(username)
+        if revisions is None:
+            return render_template('prompt.html')
         prompt = build_prompt_from_revisions(username, revisions)
 
         analysis = None
         if action == "analyze":
-            analysis = analyze_with_gpt(prompt)
-        
-            classification_update(username, analysis)
+            analysis = _classify(username, revisions, prompt)
         
         return render_template('prompt.html', 
                                username=username, 
@@ -776,11 +825,12 @@ def classifier():
                                analysis=analysis)
     
     if username:
-        revisions = get_user_revisions_diff(username)
+        revisions = _fetch_user_revisions_diff(username)
+        if revisions is None:
+            return render_template('prompt.html')
         prompt = build_prompt_from_revisions(username, revisions)
-        analysis = analyze_with_gpt(prompt)
-
-        classification_update(username, analysis)
+        # Page views reuse the stored answer while the user has no new edit
+        analysis = _classify(username, revisions, prompt)
 
         return render_template('prompt.html',
                              username=username,
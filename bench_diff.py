@@ -0,0 +1,70 @@
+import argparse
+import difflib
+import time
+from classifier import generate_diff, get_revision_contents
+from wikiapi import api_get
+
+# Benchmark of classifier.generate_diff against the former difflib.Differ
+# implementation, on consecutive revisions of large real articles.
+# Usage: python bench_diff.py [--titles France Paris] [--pairs 5]
+
+DEFAULT_TITLES = ["France", "Paris", "Emmanuel Macron", "Seconde Guerre mondiale"]
+
+def difflib_diff(old_text, new_text):
+    """The previous generate_diff, kept as the reference."""
+    differ = difflib.Differ()
+    diff = list(differ.compare(
+        old_text.splitlines(keepends=True),
+        new_text.splitlines(keepends=True)
+    ))
+
+    result = []
+    for line in diff:
+        if line.startswith('+ ') and not line.startswith('+++'):
+            result.insert(0, f"<span class='added'>{line[2:]}</span>")
+        elif line.startswith('- ') and not line.startswith('---'):
+            result.append(f"<span class='removed'>{line[2:]}</span>")
+
+    return "".join(result) if result else "[Aucun changement de texte détecté]"
+
+def revision_pairs(title, pairs):
+    """(parent text, text) of the latest `pairs` edits of an article."""
+    data = api_get({
+        "action": "query",
+        "prop": "revisions",
+        "titles": title,
+        "rvprop": "ids",
+        "rvlimit": pairs + 1,
+        "formatversion": "2"
+    }, endpoint='revisions')
+    revids = [rev['revid'] for page in data['query']['pages'] for rev in page.get('revisions', [])]
+    contents = get_revision_contents(revids)
+    texts = [contents.get(revid, "") for revid in reversed(revids)]
+    return list(zip(texts, texts[1:]))
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def run(titles, pairs):
+    total_old = total_new = 0.0
+    for title in titles:
+        for old_text, new_text in revision_pairs(title, pairs):
+            reference, old_time = timed(difflib_diff, old_text, new_text)
+            result, new_time = timed(generate_diff, old_text, new_text)
+            total_old += old_time
+            total_new += new_time
+            # Both engines may align moved lines differently, compare the line sets
+            same = sorted(reference.split("</span>")) == sorted(result.split("</span>"))
+            print(f"[bench_diff] {title} ({len(new_text) // 1024} Ko): difflib {old_time * 1000:.0f} ms, "
+                  f"generate_diff {new_time * 1000:.0f} ms, {'identique' if same else 'différent'}")
+    if total_new:
+        print(f"[bench_diff] Total : difflib {total_old:.2f}s, generate_diff {total_new:.2f}s (x{total_old / total_new:.0f})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark generate_diff on real article revisions.")
+    parser.add_argument("--titles", nargs="*", default=DEFAULT_TITLES)
+    parser.add_argument("--pairs", type=int, default=5, help="Consecutive revision pairs per article")
+    args = parser.parse_args()
+    run(args.titles, args.pairs)
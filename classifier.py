@@ -1,117 +1,249 @@
 import sqlite3
-import requests
-import difflib
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
+from wikiapi import api_get
+from ratelimit import request_priority, BACKGROUND
+from linediff import diff_lines
+from prompt_budget import PROMPT_TOKEN_BUDGET, estimate_tokens, pack_diffs, split_hunks
+from prefilter import prefilter_user, PREFILTER_MODEL
+from revision_store import get_contents, put_contents, cache_stats
 
 load_dotenv()
 
+# MediaWiki limits for non-bot accounts
+USERS_PER_CONTRIBS_REQUEST = 50
+REVIDS_PER_REQUEST = 50
+# uclimit=max pages read per user batch before falling back to single users
+CONTRIBS_MAX_PAGES = 5
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4.1-mini")
+# Concurrency of each stage of analyze_top_contributors
+FETCH_WORKERS = 2
+DIFF_WORKERS = 2
+LLM_WORKERS = 4
+# Users sent in one packed LLM request, 1 disables packing
+LLM_PACK_SIZE = int(os.getenv("LLM_PACK_SIZE", 5))
+# Answer tokens allowed per user of a packed request
+PACKED_TOKENS_PER_USER = 120
+# Classifications written per transaction
+WRITE_BATCH_SIZE = 20
+
 # Configurez votre clé API
+# OPENAI_BASE_URL points the client to any OpenAI-compatible endpoint
+# (a local server for tests, a proxy...)
 client = OpenAI(
-  api_key = os.getenv("API_KEY")
+  api_key = os.getenv("API_KEY"),
+  base_url = os.getenv("OPENAI_BASE_URL") or None
 )
 
 def get_user_revisions_diff(username, limit=10):
-    """Récupère les dernières révisions d'un utilisateur sur Wikipédia (langue FR)"""
-    S = requests.Session()
-    URL = "https://fr.wikipedia.org/w/api.php"
-
-    PARAMS = {
-        "action": "query",
-        "list": "usercontribs",
-        "ucuser": username,
-        "uclimit": limit,
-        "ucprop": "title|timestamp|comment|flags|ids|sizediff",
-        "format": "json"
-    }
+    """
+    Récupère les dernières révisions d'un utilisateur sur Wikipédia (langue FR).
+    API errors are raised: a placeholder would be classified and cached.
+    """
+    return get_users_revisions_diff([username], limit)[username]
 
-    try:
-        response = S.get(url=URL, params=PARAMS, timeout=15)
-        data = response.json()
-        revisions = data.get("query", {}).get("usercontribs", [])
-        
+def get_users_revisions_diff(usernames, limit=10):
+    """
+    Same as get_user_revisions_diff for many users at once:
+    {username: revisions}. Contributions are listed for up to 50 users per
+    call and every current and parent text is fetched in shared batches.
+    """
+    contribs = fetch_users_revisions(usernames, limit)
+    for revisions in contribs.values():
+        add_diffs(revisions)
+    return contribs
+
+def fetch_users_revisions(usernames, limit=10):
+    """
+    Network part of get_users_revisions_diff: the contributions of each user
+    with their text in 'content' and the parent text in 'parent_content'.
+    """
+    contribs = get_users_contribs(usernames, limit)
+
+    revids = set()
+    for revisions in contribs.values():
         for rev in revisions:
-            revid = rev['revid']
-            current_content = get_revision_content(revid)
-            
-            parent_content = ""
-            if 'parentid' in rev:
-                parent_content = get_revision_content(rev['parentid'])
-            
-            rev['content'] = current_content
-            rev['diff'] = generate_diff(parent_content, current_content) if parent_content else "[Première version]"
-            rev['flags'] = ', '.join(rev.get('flags', [])) or 'Aucun'
-            
-        return revisions
-    except Exception as e:
-        return [{"title": "[Erreur]", "content": str(e)}]
+            revids.add(rev['revid'])
+            if rev.get('parentid'):
+                revids.add(rev['parentid'])
+    contents = get_revision_contents(revids)
+
+    for revisions in contribs.values():
+        for rev in revisions:
+            rev['content'] = contents.get(rev['revid'], "")
+            rev['parent_content'] = contents.get(rev.get('parentid'), "")
+    return contribs
+
+def add_diffs(revisions):
+    """CPU part of get_users_revisions_diff: diff each revision against its parent."""
+    for rev in revisions:
+        parent_content = rev.pop('parent_content', "")
+        rev['diff'] = generate_diff(parent_content, rev['content']) if parent_content else "[Première version]"
+        rev['flags'] = ', '.join(rev.get('flags', [])) or 'Aucun'
+    return revisions
+
+def _normalize_username(username):
+    """MediaWiki's form of a user name: 'jean_dupont ' -> 'Jean dupont'."""
+    name = " ".join(username.replace("_", " ").split())
+    return name[:1].upper() + name[1:]
+
+def get_users_contribs(usernames, limit=10):
+    """
+    Latest `limit` contributions of each user, {username: contribs}.
+    Users are queried USERS_PER_CONTRIBS_REQUEST at a time; results come
+    mixed by date, so after CONTRIBS_MAX_PAGES pages the users still short
+    of `limit` (quiet editors drowned out by very active ones) are queried
+    one by one.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    contribs = {username: [] for username in usernames}
+    incomplete = []
+
+    for i in range(0, len(usernames), USERS_PER_CONTRIBS_REQUEST):
+        batch = usernames[i:i + USERS_PER_CONTRIBS_REQUEST]
+        # Rows carry the normalized name, map it back to the requested one
+        requested = {_normalize_username(username): username for username in batch}
+        params = {
+            "action": "query",
+            "list": "usercontribs",
+            "ucuser": "|".join(batch),
+            "uclimit": "max",
+            "ucprop": "title|timestamp|comment|flags|ids|sizediff",
+            "continue": ""
+        }
+        for _ in range(CONTRIBS_MAX_PAGES):
+            data = api_get(params, endpoint='contribs')
+            for rev in data.get("query", {}).get("usercontribs", []):
+                # A lone user owns every row, whatever normalization the API applied
+                username = batch[0] if len(batch) == 1 else requested.get(rev.get("user"), rev.get("user"))
+                user_contribs = contribs.get(username)
+                if user_contribs is not None and len(user_contribs) < limit:
+                    user_contribs.append(rev)
+            if "continue" not in data or all(len(contribs[u]) >= limit for u in batch):
+                break
+            params.update(data["continue"])
+        else:
+            incomplete.extend(u for u in batch if len(contribs[u]) < limit)
+
+    for username in incomplete:
+        data = api_get({
+            "action": "query",
+            "list": "usercontribs",
+            "ucuser": username,
+            "uclimit": limit,
+            "ucprop": "title|timestamp|comment|flags|ids|sizediff"
+        }, endpoint='contribs')
+        contribs[username] = data.get("query", {}).get("usercontribs", [])
+
+    for username in usernames:
+        contribs[username].sort(key=lambda rev: rev['timestamp'], reverse=True)
+    print(f"[get_users_contribs] {len(usernames)} utilisateurs, {len(incomplete)} requêtes individuelles")
+    return contribs
 
 def get_revision_content(revid):
-    """Récupère le contenu d'une révision spécifique"""
-    S = requests.Session()
-    URL = "https://fr.wikipedia.org/w/api.php"
-    
-    PARAMS = {
-        "action": "query",
-        "prop": "revisions",
-        "revids": revid,
-        "rvprop": "content|ids",
-        "rvslots": "main",
-        "format": "json",
-        "formatversion": "2"
-    }
-    
-    try:
-        response = S.get(url=URL, params=PARAMS, timeout=10)
-        data = response.json()
-        
-        if 'pages' in data.get('query', {}):
-            for page in data['query']['pages']:
-                if 'revisions' in page:
-                    return page['revisions'][0]['slots']['main']['content']
-        return ""
-    except Exception as e:
-        print(f"Erreur révision {revid}: {str(e)}")
-        return ""
+    """
+    Récupère le contenu d'une révision spécifique.
+    API failures propagate, an empty text would pass for a real revision.
+    """
+    return get_revision_contents([revid]).get(revid, "")
+
+def get_revision_contents(revids):
+    """
+    Texts of many revisions, {revid: content}. Revision content is
+    immutable: revisions already downloaded are served from the local
+    revision store, the others are fetched REVIDS_PER_REQUEST per call.
+    Deleted or hidden revisions are left out.
+    """
+    revids = [revid for revid in dict.fromkeys(revids) if revid]
+    contents = get_contents(revids)
+    missing = [revid for revid in revids if revid not in contents]
+
+    fetched = {}
+    for i in range(0, len(missing), REVIDS_PER_REQUEST):
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "revids": "|".join(str(revid) for revid in missing[i:i + REVIDS_PER_REQUEST]),
+            "rvprop": "content|ids",
+            "rvslots": "main",
+            "formatversion": "2",
+            "continue": ""
+        }
+        while True:
+            data = api_get(params, endpoint='content')
+            for page in data.get('query', {}).get('pages', []):
+                for rev in page.get('revisions', []):
+                    # Deleted or hidden revisions come without content, not cached
+                    content = rev.get('slots', {}).get('main', {}).get('content')
+                    if content is not None:
+                        fetched[rev['revid']] = content
+            # Large texts can overflow one response, the rest comes with continue
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+
+    put_contents(fetched)
+    contents.update(fetched)
+    return contents
 
 def generate_diff(old_text, new_text):
-    """Génère un diff lisible entre deux versions"""
-    differ = difflib.Differ()
-    diff = list(differ.compare(
-        old_text.splitlines(keepends=True),
-        new_text.splitlines(keepends=True)
-    ))
-    
-    result = []
-    for line in diff:
-        if line.startswith('+ ') and not line.startswith('+++'):
-            result.insert(0,f"<span class='added'>{line[2:]}</span>")
-        elif line.startswith('- ') and not line.startswith('---'):
-            result.append(f"<span class='removed'>{line[2:]}</span>")
-    
+    """
+    Génère un diff lisible entre deux versions.
+    Only the changed lines are computed (see linediff). Output as before:
+    added lines, last first, then removed lines.
+    """
+    added = []
+    removed = []
+    for op, line in diff_lines(old_text.splitlines(keepends=True), new_text.splitlines(keepends=True)):
+        if op == '+':
+            added.append(f"<span class='added'>{line}</span>")
+        else:
+            removed.append(f"<span class='removed'>{line}</span>")
+
+    result = added[::-1] + removed
     return "".join(result) if result else "[Aucun changement de texte détecté]"
 
-def build_prompt_from_revisions(username, revisions):
-    prompt = (
-        f"Analyse des contributions de l'utilisateur Wikipédia '{username}':\n\n"
-        "Tu dois analyser l’ensemble des révisions ci-dessous pour détecter une orientation idéologique potentielle. "
-        "Ignore les fautes de frappe ou les contributions techniques.\n\n"
-    )
+# Shared by single and packed prompts
+SYSTEM_PROMPT = "Vous êtes un agent spécialisé dans Wikipédia qui combat l'antisémite."
+CLASSIFICATION_CRITERIA = (
+    "Critères d'analyse :\n"
+    "- Pro-palestine : modifications ou commentaires qui accusent Israël (colonisation, apartheid, génocide, etc.), mettent en avant les victimes palestiniennes, ou utilisent des sources pro-palestiniennes.\n"
+    "- Pro-israel : modifications qui soutiennent les actions militaires d'Israël, parlent de terrorisme palestinien, défendent Tsahal, ou utilisent des sources pro-israéliennes.\n"
+    "- Neutre : modifications équilibrées ou factuelles, présentant les deux points de vue, ou évitant les termes émotionnellement chargés.\n\n"
+)
 
-    for rev in revisions:
-        prompt += (
+def _revisions_block(revisions, token_budget=PROMPT_TOKEN_BUDGET):
+    # The most informative diff lines of all revisions share the budget
+    excerpts = pack_diffs(revisions, token_budget)
+    block = ""
+    for rev, excerpt in zip(revisions, excerpts):
+        diff = rev.get('diff', '[Diff non disponible]')
+        if not excerpt:
+            # Placeholders like [Première version] are kept as they are
+            excerpt = diff if not split_hunks(diff) else "[Extrait omis]"
+        block += (
             f"--- Article : {rev['title']} ---\n"
             f"Flags : {rev.get('flags', 'Aucun')}\n"
             f"Commentaire : {rev.get('comment', 'Aucun')}\n"
-            f"Modifications (extrait) :\n{rev.get('diff', '[Diff non disponible]')[:1000]}\n\n"
+            f"Modifications (extrait) :\n{excerpt}\n\n"
         )
+    return block
 
+def build_prompt_from_revisions(username, revisions):
+    prompt = (
+        f"Analyse des contributions de l'utilisateur Wikipédia '{username}':\n\n"
+        "Tu dois analyser l’ensemble des révisions ci-dessous pour détecter une orientation idéologique potentielle. "
+        "Ignore les fautes de frappe ou les contributions techniques.\n\n"
+    )
+    prompt += _revisions_block(revisions)
     prompt += (
-        "Critères d'analyse :\n"
-        "- Pro-palestine : modifications ou commentaires qui accusent Israël (colonisation, apartheid, génocide, etc.), mettent en avant les victimes palestiniennes, ou utilisent des sources pro-palestiniennes.\n"
-        "- Pro-israel : modifications qui soutiennent les actions militaires d'Israël, parlent de terrorisme palestinien, défendent Tsahal, ou utilisent des sources pro-israéliennes.\n"
-        "- Neutre : modifications équilibrées ou factuelles, présentant les deux points de vue, ou évitant les termes émotionnellement chargés.\n\n"
+        CLASSIFICATION_CRITERIA +
         "Instructions :\n"
         "Classifie l'utilisateur selon l'orientation globale de ses contributions comme 'pro-palestine', 'pro-israel' ou 'neutre'.\n"
         "Donne une justification en 20 à 30 mots.\n\n"
@@ -122,13 +254,38 @@ def build_prompt_from_revisions(username, revisions):
     
     return prompt
 
+def build_packed_prompt(users):
+    """
+    One prompt for several users, [(username, revisions)]: the instructions
+    and criteria are sent once and the answer is a JSON object with one
+    entry per user.
+    """
+    prompt = (
+        f"Analyse des contributions de {len(users)} utilisateurs Wikipédia.\n\n"
+        "Pour chaque utilisateur, tu dois analyser l’ensemble de ses révisions pour détecter une orientation idéologique potentielle. "
+        "Ignore les fautes de frappe ou les contributions techniques. "
+        "Chaque utilisateur est jugé uniquement sur ses propres révisions.\n\n"
+    )
+    for username, revisions in users:
+        prompt += f"=== Utilisateur : {username} ===\n\n" + _revisions_block(revisions)
+
+    prompt += (
+        CLASSIFICATION_CRITERIA +
+        "Instructions :\n"
+        "Classifie chaque utilisateur selon l'orientation globale de ses contributions comme 'pro-palestine', 'pro-israel' ou 'neutre'.\n"
+        "Donne pour chacun une justification en 20 à 30 mots.\n\n"
+        "Format de réponse, en JSON uniquement :\n"
+        '{"results": [{"username": "...", "classification": "pro-palestine|pro-israel|neutre", "justification": "..."}]}'
+    )
+    return prompt
+
 def analyze_with_gpt(prompt):
     """Analyse le prompt avec l'API OpenAI"""
     try:
         response = client.chat.completions.create(
-            model="gpt-4.1-mini",
+            model=LLM_MODEL,
             messages=[
-                {"role": "system", "content": "Vous êtes un agent spécialisé dans Wikipédia qui combat l'antisémite."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
@@ -139,6 +296,24 @@ def analyze_with_gpt(prompt):
         return classification, full_response
     except Exception as e:
         return f"Erreur d'analyse: {str(e)}"
+
+def analyze_packed_with_gpt(users):
+    """
+    Classify several users, [(username, revisions)], in one request.
+    Returns {username: (classification, response)} for the users found in
+    the answer; the others are left to single-user calls.
+    """
+    response = client.chat.completions.create(
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_packed_prompt(users)}
+        ],
+        temperature=0.3,
+        max_tokens=PACKED_TOKENS_PER_USER * len(users),
+        response_format={"type": "json_object"}
+    )
+    return parse_packed_analysis(response.choices[0].message.content, [username for username, _ in users])
     
 def parse_analysis(text):
     # Parse la réponse structurée de GPT
@@ -155,46 +330,278 @@ def parse_analysis(text):
     
     return classification
 
+def parse_packed_analysis(text, usernames):
+    """
+    Map a packed JSON answer back to the users. Entries with an unknown user
+    or a classification outside the three labels are dropped. The response
+    is rewritten in the single-user format, so stored answers look the same.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    entries = data.get("results", []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = set(usernames)
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get("username") not in wanted:
+            continue
+        label = str(entry.get("classification", "")).strip().lower()
+        if 'palestine' in label:
+            classification = 'pro-palestine'
+        elif 'israel' in label:
+            classification = 'pro-israel'
+        elif 'neutre' in label:
+            classification = 'neutre'
+        else:
+            continue
+        full_response = f"Classification: {classification}\nJustification: {entry.get('justification', '')}"
+        results[entry["username"]] = (classification, full_response)
+    return results
+
+def prompt_hash(prompt, model=LLM_MODEL):
+    """Key of a classification: same prompt and model give the same answer."""
+    return hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+def get_cached_classification(conn, phash, model=LLM_MODEL):
+    """
+    Stored (classification, raw_response) for a prompt hash, or None.
+    A hit also marks the user as checked now.
+    """
+    row = conn.execute(
+        "SELECT id, classification, raw_response FROM classifications WHERE prompt_hash = ? AND model = ?",
+        (phash, model)
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE classifications SET checked_at = datetime('now') WHERE id = ?", (row[0],))
+    conn.commit()
+    return row[1], row[2]
+
+def store_classification(conn, username, revisions, phash, analysis, model=LLM_MODEL):
+    """Record an answer (LLM or local pre-filter) with the inputs it was given."""
+    revision_ids = ','.join(str(rev['revid']) for rev in revisions if rev.get('revid'))
+    conn.execute("""
+        INSERT INTO classifications
+            (username, prompt_hash, model, revision_ids, raw_response, classification, created_at, checked_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        ON CONFLICT(prompt_hash, model) DO UPDATE SET
+            raw_response = excluded.raw_response,
+            classification = excluded.classification,
+            created_at = excluded.created_at,
+            checked_at = excluded.checked_at
+    """, (username, phash, model, revision_ids, analysis[1], analysis[0]))
+
+def classify_user(conn, username, revisions, prompt=None):
+    """
+    analyze_with_gpt with a result store: when the prompt (same revisions,
+    same diffs) was already sent to the same model, the stored answer is
+    returned without calling the LLM.
+    """
+    # Nothing to judge: an empty prompt must neither reach the LLM nor be cached
+    if not revisions:
+        return f"Aucune contribution trouvée pour {username}"
+    prompt = prompt or build_prompt_from_revisions(username, revisions)
+    phash = prompt_hash(prompt)
+    cached = get_cached_classification(conn, phash)
+    if cached:
+        print(f"[classify_user] {username}: entrées inchangées, classification en cache")
+        return cached
+
+    analysis = analyze_with_gpt(prompt)
+    # Errors come back as a string and are not stored
+    if isinstance(analysis, tuple):
+        store_classification(conn, username, revisions, phash, analysis)
+        conn.commit()
+    return analysis
+
+def _fetch_stage(usernames):
+    # Background class: the nightly run must not slow down the web routes
+    with request_priority(BACKGROUND):
+        return fetch_users_revisions(usernames)
+
+def _diff_stage(username, revisions):
+    # Runs in a worker process
+    return username, add_diffs(revisions)
+
+def _llm_stage(username, revisions, prompt, phash):
+    analysis = analyze_with_gpt(prompt)
+    if not isinstance(analysis, tuple):
+        raise RuntimeError(analysis)
+    return username, revisions, phash, analysis, LLM_MODEL
+
+def _packed_llm_stage(entries):
+    """
+    One request for [(username, revisions, prompt, phash)]. Returns the
+    parsed results and the entries to retry one by one.
+    """
+    try:
+        answers = analyze_packed_with_gpt([(username, revisions) for username, revisions, _, _ in entries])
+    except Exception as e:
+        print(f"[analyze_packed_with_gpt] Erreur, repli sur des appels individuels: {str(e)}")
+        answers = {}
+    results = [(username, revisions, phash, answers[username], LLM_MODEL)
+               for username, revisions, _, phash in entries if username in answers]
+    failed = [entry for entry in entries if entry[0] not in answers]
+    return results, failed
+
+def _timed(func, *args):
+    start = time.monotonic()
+    return func(*args), time.monotonic() - start
+
+def _write_classifications(conn, classifications):
+    for username, revisions, phash, analysis, model in classifications:
+        if phash is not None:
+            store_classification(conn, username, revisions, phash, analysis, model)
+    conn.executemany("""
+        UPDATE users 
+        SET classification = ?
+        WHERE username = ?
+    """, [(analysis[0], username) for username, _, _, analysis, _ in classifications])
+    conn.commit()
+
 def analyze_top_contributors(limit=100):
-    """Analyse les utilisateurs les plus actifs et met à jour leur classification"""
+    """
+    Analyse les utilisateurs les plus actifs et met à jour leur classification.
+    Users flow through a pipeline with bounded concurrency per stage:
+    network fetch (FETCH_WORKERS threads, 50 users per batch), diffs in a
+    process pool (DIFF_WORKERS), LLM calls (LLM_WORKERS threads) packing
+    LLM_PACK_SIZE users per request, with single-user calls for the users
+    missing from a packed answer. This thread is the only writer and
+    commits WRITE_BATCH_SIZE results at once.
+    Only users never classified or with new edits since their last analysis
+    are picked, prompts already answered are served from the
+    classifications store, and clearly technical editors are labelled
+    'neutre' by the local pre-filter without an LLM call.
+    """
     conn = sqlite3.connect("wikipedia.db")
     cursor = conn.cursor()
     
     # Récupérer les utilisateurs avec le plus de contributions
     cursor.execute("""
-        SELECT u.username, COUNT(r.id) as contribution_count 
-        FROM users u
-        JOIN revisions r ON r.user_id = u.id
-        WHERE u.is_bot = 0 
-          AND u.is_blocked = 0 
+        SELECT u.username, us.contributions as contribution_count
+        FROM user_stats us
+        JOIN users u ON u.id = us.user_id
+        WHERE us.contributions > 0
+          AND u.is_bot = 0
+          AND u.is_blocked = 0
           AND u.is_ip = 0
-          AND (u.classification IS NULL OR u.classification = '')
-        GROUP BY u.id
-        ORDER BY contribution_count DESC
+          -- Never classified, or edited since the last analysis. Both sides
+          -- in Unix time, and users classified before the classifications
+          -- table existed count as never checked
+          AND (u.classification IS NULL OR u.classification = ''
+               OR us.last_edit_epoch > COALESCE((
+                   SELECT CAST(strftime('%s', MAX(c.checked_at)) AS INTEGER)
+                   FROM classifications c WHERE c.username = u.username
+               ), 0))
+        ORDER BY us.contributions DESC
         LIMIT ?
     """, (limit,))
     
-    top_users = cursor.fetchall()
-    
+    usernames = [user[0] for user in cursor.fetchall()]
+
+    # Busy time summed over the workers of each stage
+    timings = {'fetch': 0.0, 'diff': 0.0, 'llm': 0.0, 'llm_packed': 0.0, 'write': 0.0}
+    start = time.monotonic()
     results = []
-    for user in top_users:
-        username = user[0]
-        try:
-            revisions = get_user_revisions_diff(username)
-            prompt = build_prompt_from_revisions(username, revisions)
-            analysis = analyze_with_gpt(prompt)
-            # Mettre à jour la base de données
-            cursor.execute("""
-                UPDATE users 
-                SET classification = ?
-                WHERE username = ?
-            """, (analysis[0], username))
-            
-            results.append((username, analysis[0]))
-        except Exception as e:
-            print(f"Erreur lors de l'analyse de {username}: {str(e)}")
-            continue
-    
-    conn.commit()
-    conn.close()
-    return results
\ No newline at end of file
+    to_write = []
+    # Users whose prompt was already answered, no LLM call
+    skipped = 0
+    # Users waiting for a packed LLM request
+    to_pack = []
+    packed_requests = 0
+    # Estimated size of the prompts sent to the LLM
+    prompt_tokens = 0
+    # Technical users labelled by the local pre-filter, and its IDF counts
+    prefiltered_count = 0
+    doc_freq = {}
+
+    def flush():
+        write_start = time.monotonic()
+        _write_classifications(conn, to_write)
+        timings['write'] += time.monotonic() - write_start
+        results.extend((username, analysis[0]) for username, _, _, analysis, _ in to_write)
+        to_write.clear()
+
+    try:
+        with ThreadPoolExecutor(FETCH_WORKERS) as fetch_pool, \
+             ProcessPoolExecutor(DIFF_WORKERS) as diff_pool, \
+             ThreadPoolExecutor(LLM_WORKERS) as llm_pool:
+            # future -> (stage, label for errors)
+            pending = {}
+            for i in range(0, len(usernames), USERS_PER_CONTRIBS_REQUEST):
+                batch = usernames[i:i + USERS_PER_CONTRIBS_REQUEST]
+                pending[fetch_pool.submit(_timed, _fetch_stage, batch)] = ('fetch', f"{len(batch)} utilisateurs")
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, label = pending.pop(future)
+                    try:
+                        # Durations are measured inside the workers
+                        value, elapsed = future.result()
+                    except Exception as e:
+                        print(f"Erreur lors de l'analyse de {label} ({stage}): {str(e)}")
+                        continue
+                    timings[stage] += elapsed
+
+                    if stage == 'fetch':
+                        for username, revisions in value.items():
+                            if not revisions:
+                                print(f"[analyze_top_contributors] {username}: aucune contribution, ignoré")
+                                continue
+                            pending[diff_pool.submit(_timed, _diff_stage, username, revisions)] = ('diff', username)
+                    elif stage == 'diff':
+                        username, revisions = value
+                        prompt = build_prompt_from_revisions(username, revisions)
+                        phash = prompt_hash(prompt)
+                        cached = get_cached_classification(conn, phash)
+                        prefiltered = None if cached else prefilter_user(revisions, doc_freq)
+                        if cached:
+                            skipped += 1
+                            to_write.append((username, revisions, None, cached, None))
+                        elif prefiltered:
+                            # Stored under its own model name, never served as an LLM answer
+                            prefiltered_count += 1
+                            to_write.append((username, revisions, prompt_hash(prompt, PREFILTER_MODEL),
+                                             prefiltered, PREFILTER_MODEL))
+                        elif LLM_PACK_SIZE > 1:
+                            prompt_tokens += estimate_tokens(prompt)
+                            to_pack.append((username, revisions, prompt, phash))
+                        else:
+                            prompt_tokens += estimate_tokens(prompt)
+                            pending[llm_pool.submit(_timed, _llm_stage, username, revisions, prompt, phash)] = ('llm', username)
+                    elif stage == 'llm_packed':
+                        results_packed, failed = value
+                        to_write.extend(results_packed)
+                        packed_requests += 1
+                        for username, revisions, prompt, phash in failed:
+                            pending[llm_pool.submit(_timed, _llm_stage, username, revisions, prompt, phash)] = ('llm', username)
+                    else:
+                        to_write.append(value)
+
+                    if len(to_write) >= WRITE_BATCH_SIZE:
+                        flush()
+
+                # Full packs go at once, the remainder when no more users can join it
+                upstream = any(stage in ('fetch', 'diff') for stage, _ in pending.values())
+                while len(to_pack) >= LLM_PACK_SIZE or (to_pack and not upstream):
+                    pack = to_pack[:LLM_PACK_SIZE]
+                    del to_pack[:LLM_PACK_SIZE]
+                    pending[llm_pool.submit(_timed, _packed_llm_stage, pack)] = ('llm_packed', f"{len(pack)} utilisateurs")
+        if to_write:
+            flush()
+    finally:
+        conn.close()
+
+    stats = cache_stats()
+    print(f"[analyze_top_contributors] {len(results)}/{len(usernames)} utilisateurs classés en {time.monotonic() - start:.1f}s "
+          f"(fetch {timings['fetch']:.1f}s, diff {timings['diff']:.1f}s, llm {timings['llm'] + timings['llm_packed']:.1f}s, écriture {timings['write']:.1f}s)")
+    print(f"[analyze_top_contributors] {skipped} classifications reprises du cache, sans appel au LLM, "
+          f"{packed_requests} requêtes groupées, ~{prompt_tokens} tokens de prompt")
+    print(f"[analyze_top_contributors] Pré-filtre local : {prefiltered_count} appels au LLM évités")
+    print(f"[analyze_top_contributors] Cache des révisions : {stats['hits']} hits, {stats['misses']} misses")
+    return results
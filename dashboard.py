@@ -3,6 +3,7 @@ import sqlite3
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+import hot_queries
 
 DB_PATH = "wikipedia.db"
 
@@ -16,17 +17,7 @@ def show_article_stats(conn, article_title):
     stats = {}
     
     # Requêtes pour les statistiques de l'article
-    article_stats_query = """
-        SELECT 
-            COUNT(r.id) as revisions,
-            COUNT(DISTINCT r.user_id) as unique_users,
-            MAX(r.timestamp) as last_updated
-        FROM articles a
-        LEFT JOIN revisions r ON a.id = r.article_id
-        WHERE a.title = ?
-        GROUP BY a.id
-    """
-    article_stats = conn.execute(article_stats_query, (article_title,)).fetchone()
+    article_stats = conn.execute(hot_queries.ARTICLE_STATS, (article_title,)).fetchone()
     
     if article_stats:
         stats['revisions'] = article_stats['revisions']
@@ -34,31 +25,12 @@ def show_article_stats(conn, article_title):
         stats['last_updated'] = datetime.fromisoformat(article_stats['last_updated']).strftime('%d-%m-%Y %H:%M') if article_stats['last_updated'] else "N/A"
         
         # Pourcentages de bots et comptes bloqués
-        user_stats_query = """
-            SELECT 
-                ROUND(100.0 * SUM(u.is_bot) / COUNT(DISTINCT r.user_id), 1) as bots_percentage,
-                ROUND(100.0 * SUM(u.is_blocked) / COUNT(DISTINCT r.user_id), 1) as blocked_percentage
-            FROM revisions r
-            JOIN users u ON r.user_id = u.id
-            JOIN articles a ON r.article_id = a.id
-            WHERE a.title = ?
-        """
-        user_stats = conn.execute(user_stats_query, (article_title,)).fetchone()
+        user_stats = conn.execute(hot_queries.ARTICLE_USER_SHARES, (article_title,)).fetchone()
         stats['bots_percentage'] = user_stats['bots_percentage'] if user_stats and user_stats['bots_percentage'] is not None else 0
         stats['blocked_percentage'] = user_stats['blocked_percentage'] if user_stats and user_stats['blocked_percentage'] is not None else 0
         
         # Utilisateur le plus actif
-        top_editor_query = """
-            SELECT u.username, COUNT(r.id) as revision_count
-            FROM users u
-            JOIN revisions r ON u.id = r.user_id
-            JOIN articles a ON r.article_id = a.id
-            WHERE a.title = ?
-            GROUP BY u.id
-            ORDER BY revision_count DESC
-            LIMIT 1
-        """
-        top_editor = conn.execute(top_editor_query, (article_title,)).fetchone()
+        top_editor = conn.execute(hot_queries.ARTICLE_TOP_EDITOR, (article_title,)).fetchone()
         stats['top_editor'] = f"{top_editor['username']} ({top_editor['revision_count']} révisions)" if top_editor else "N/A"
     
     return stats
@@ -66,29 +38,16 @@ def show_article_stats(conn, article_title):
 def get_tag_statistics(conn, article_titles=None):
     """Analyse la répartition des tags parmi les révisions en utilisant le schéma réel"""
     try:
-        # Requête pour récupérer les tags
-        base_query = """
-            SELECT r.tags as tags_str
-            FROM revisions r
-            {article_join}
-            WHERE r.tags IS NOT NULL AND r.tags != ''
-            {article_filter}
-        """
-        
-        # Filtre par article si spécifié
-        article_join = ""
-        article_filter = ""
-        params = []
+        # Requête pour récupérer les tags, filtrée par article si spécifié
         if article_titles:
-            article_join = "JOIN articles a ON r.article_id = a.id"
-            article_filter = "AND a.title IN ({})".format(','.join(['?']*len(article_titles)))
+            tags_query = hot_queries.ARTICLES_TAGS.format(titles=','.join(['?']*len(article_titles)))
             params = article_titles
+        else:
+            tags_query = hot_queries.TAGS
+            params = []
 
         # Exécution de la requête
-        revisions = conn.execute(
-            base_query.format(article_join=article_join, article_filter=article_filter),
-            params
-        ).fetchall()
+        revisions = conn.execute(tags_query, params).fetchall()
 
         # Comptage des tags
         tag_counts = {}
@@ -157,15 +116,7 @@ def show_admin_dashboard():
 
     l2col1, l2col2, l2col3 = st.columns(3)
 
-    top_editor_query = """
-        SELECT u.username, COUNT(r.id) as revision_count
-        FROM users u
-        JOIN revisions r ON u.id = r.user_id
-        GROUP BY u.id
-        ORDER BY revision_count DESC
-        LIMIT 1
-    """
-    top_editor = conn.execute(top_editor_query).fetchone()
+    top_editor = conn.execute(hot_queries.TOP_EDITOR).fetchone()
     if top_editor:
         l2col1.metric(
             "Utilisateur le Plus Actif",
@@ -175,15 +126,7 @@ def show_admin_dashboard():
     else:
         l2col1.metric("Utilisateur le Plus Actif", "N/A")
 
-    most_controversial_query = """
-        SELECT a.title, COUNT(r.id) as revision_count
-        FROM articles a
-        JOIN revisions r ON a.id = r.article_id
-        GROUP BY a.id
-        ORDER BY revision_count DESC
-        LIMIT 1
-    """
-    most_controversial_article = conn.execute(most_controversial_query).fetchone()
+    most_controversial_article = conn.execute(hot_queries.MOST_EDITED_ARTICLE).fetchone()
     if most_controversial_article:
         l2col2.metric(
             "Article le Plus Controversé",
@@ -193,14 +136,7 @@ def show_admin_dashboard():
     else:
         l2col2.metric("Article le Plus Controversé", "N/A")
 
-    last_revised_query = """
-        SELECT a.title, r.timestamp
-        FROM revisions r
-        JOIN articles a ON r.article_id = a.id
-        ORDER BY r.timestamp DESC
-        LIMIT 1
-    """
-    last_revised_article = conn.execute(last_revised_query).fetchone()
+    last_revised_article = conn.execute(hot_queries.LAST_REVISED_ARTICLE).fetchone()
     if last_revised_article:
         last_revision_date = datetime.fromisoformat(last_revised_article['timestamp']).strftime('%d-%m-%Y %H:%M')
         l2col3.metric(
@@ -262,32 +198,10 @@ def show_admin_dashboard():
         
         # Requête des articles
         if selected_articles:
-            articles_query = """
-                SELECT a.id, a.title,
-                       COUNT(r.id) AS revisions,
-                       COUNT(DISTINCT r.user_id) AS unique_users,
-                       MAX(r.timestamp) AS last_updated
-                FROM articles a
-                LEFT JOIN revisions r ON a.id = r.article_id
-                WHERE a.title IN ({})
-                GROUP BY a.id
-                ORDER BY revisions DESC
-            """.format(','.join(['?']*len(selected_articles)))
+            articles_query = hot_queries.SELECTED_ARTICLES.format(titles=','.join(['?']*len(selected_articles)))
             articles_df = pd.read_sql(articles_query, conn, params=selected_articles)
         else:
-            articles_query = """
-                SELECT a.id, a.title,
-                       COUNT(r.id) AS revisions,
-                       COUNT(DISTINCT r.user_id) AS unique_users,
-                       MAX(r.timestamp) AS last_updated
-                FROM articles a
-                LEFT JOIN revisions r ON a.id = r.article_id
-                GROUP BY a.id
-                HAVING revisions >= ?
-                ORDER BY revisions DESC
-                LIMIT 15
-            """
-            articles_df = pd.read_sql(articles_query, conn, params=(min_revisions,))
+            articles_df = pd.read_sql(hot_queries.TOP_ARTICLES, conn, params=(min_revisions,))
         
         if not articles_df.empty:
             fig = px.bar(
@@ -307,14 +221,7 @@ def show_admin_dashboard():
         
         if selected_articles:
             # Chronologie pour les articles sélectionnés
-            timeline_query = """
-                SELECT a.title, date(r.timestamp) as day, COUNT(*) as revisions
-                FROM revisions r
-                JOIN articles a ON r.article_id = a.id
-                WHERE a.title IN ({})
-                GROUP BY a.title, day
-                ORDER BY day
-            """.format(','.join(['?']*len(selected_articles)))
+            timeline_query = hot_queries.ARTICLES_TIMELINE.format(titles=','.join(['?']*len(selected_articles)))
             timeline_df = pd.read_sql(timeline_query, conn, params=selected_articles)
             
             if not timeline_df.empty:
@@ -331,12 +238,7 @@ def show_admin_dashboard():
                 st.warning("Aucune donnée de révision pour les articles sélectionnés.")
         else:
             # Chronologie globale
-            timeline_df = pd.read_sql("""
-                SELECT date(timestamp) as day, COUNT(*) as revisions
-                FROM revisions
-                GROUP BY day
-                ORDER BY day
-            """, conn)
+            timeline_df = pd.read_sql(hot_queries.TIMELINE, conn)
             
             if not timeline_df.empty:
                 fig = px.line(
@@ -388,34 +290,15 @@ def show_admin_dashboard():
         show_bots = st.checkbox("Inclure les bots", value=True)
         
         # Requête utilisateurs
-        user_query = """
-            SELECT u.username,
-                   COUNT(r.id) as revisions,
-                   u.is_bot,
-                   u.is_ip,
-                   u.is_blocked
-            FROM users u
-            LEFT JOIN revisions r ON u.id = r.user_id
-            {article_filter}
-            GROUP BY u.id
-            HAVING revisions > 0
-            {bot_filter}
-            ORDER BY revisions DESC
-            LIMIT ?
-        """
-        
-        params = [num_users]
-        article_filter = ""
-        bot_filter = ""
-        
+        bot_filter = "" if show_bots else hot_queries.BOT_FILTER
         if selected_articles:
-            article_filter = "JOIN articles a ON r.article_id = a.id WHERE a.title IN ({})".format(','.join(['?']*len(selected_articles)))
-            params = selected_articles + params
-        
-        if not show_bots:
-            bot_filter = "AND u.is_bot = 0"
+            user_query = hot_queries.ARTICLES_USERS_ACTIVITY.format(
+                titles=','.join(['?']*len(selected_articles)), bot_filter=bot_filter)
+            params = selected_articles + [num_users]
+        else:
+            user_query = hot_queries.USERS_ACTIVITY.format(bot_filter=bot_filter)
+            params = [num_users]
         
-        user_query = user_query.format(article_filter=article_filter, bot_filter=bot_filter)
         user_activity_df = pd.read_sql(user_query, conn, params=params)
         
         if not user_activity_df.empty:
@@ -442,30 +325,10 @@ def show_admin_dashboard():
             st.subheader("Répartition des Types d'Utilisateurs")
             
             if selected_articles:
-                user_types_query = """
-                    SELECT
-                        SUM(CASE WHEN u.is_bot = 1 THEN 1 ELSE 0 END) as "Bots",
-                        SUM(CASE WHEN u.is_ip = 1 THEN 1 ELSE 0 END) as "Adresses IP",
-                        SUM(CASE WHEN u.is_blocked = 1 THEN 1 ELSE 0 END) as "Bloqués",
-                        SUM(CASE WHEN u.is_bot = 0 AND u.is_ip = 0 THEN 1 ELSE 0 END) as "Normaux"
-                    FROM (
-                        SELECT DISTINCT u.id, u.is_bot, u.is_ip, u.is_blocked
-                        FROM users u
-                        JOIN revisions r ON u.id = r.user_id
-                        JOIN articles a ON r.article_id = a.id
-                        WHERE a.title IN ({})
-                    ) u
-                """.format(','.join(['?']*len(selected_articles)))
+                user_types_query = hot_queries.ARTICLES_USER_TYPES.format(titles=','.join(['?']*len(selected_articles)))
                 user_types_df = pd.read_sql(user_types_query, conn, params=selected_articles)
             else:
-                user_types_df = pd.read_sql("""
-                    SELECT
-                        SUM(is_bot) as "Bots",
-                        SUM(is_ip) as "Adresses IP",
-                        SUM(is_blocked) as "Bloqués",
-                        SUM(CASE WHEN is_bot = 0 AND is_ip = 0 THEN 1 ELSE 0 END) as "Normaux"
-                    FROM users
-                """, conn)
+                user_types_df = pd.read_sql(hot_queries.USER_TYPES, conn)
             
             if not user_types_df.empty:
                 col1, col2 = st.columns(2)
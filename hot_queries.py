@@ -0,0 +1,224 @@
+# SQL of the hot queries of app.py and dashboard.py. The pages and the
+# EXPLAIN QUERY PLAN check of migrations.py (HOT_QUERIES) share these texts,
+# so the checked plan is always the plan of the query that runs.
+# {titles} stands for one '?' per selected article, {bot_filter} for an
+# optional "AND u.is_bot = 0".
+
+BOT_FILTER = "AND u.is_bot = 0"
+
+# --- app.py ---
+
+ARTICLE_REVISION_COUNT = """
+    SELECT COUNT(*) FROM revisions
+    WHERE article_id = (SELECT id FROM articles WHERE title = ?)
+"""
+
+USER_BY_NAME = """
+    SELECT id, username, is_ip, is_bot, is_blocked, classification
+    FROM users
+    WHERE username = ?
+"""
+
+# Total and statistics, kept up to date by the triggers
+USER_STATS = """
+    SELECT COALESCE(contributions, 0) as total,
+           COALESCE(articles, 0) as edited_articles_count,
+           first_edit, last_edit
+    FROM users u
+    LEFT JOIN user_stats us ON us.user_id = u.id
+    WHERE u.id = ?
+"""
+
+SEARCH_ARTICLES = """
+    SELECT title FROM articles
+    WHERE title LIKE ?
+    LIMIT 50
+"""
+
+# LIKE ignores case, and a bare column with a single pattern parameter can
+# use idx_users_username_nocase
+SEARCH_USERS = """
+    SELECT username, is_bot, is_blocked FROM users
+    WHERE username LIKE ?
+    LIMIT 50
+"""
+
+# --- dashboard.py, one article ---
+
+ARTICLE_STATS = """
+    SELECT
+        COUNT(r.id) as revisions,
+        COUNT(DISTINCT r.user_id) as unique_users,
+        MAX(r.timestamp) as last_updated
+    FROM articles a
+    LEFT JOIN revisions r ON a.id = r.article_id
+    WHERE a.title = ?
+    GROUP BY a.id
+"""
+
+ARTICLE_USER_SHARES = """
+    SELECT
+        ROUND(100.0 * SUM(u.is_bot) / COUNT(DISTINCT r.user_id), 1) as bots_percentage,
+        ROUND(100.0 * SUM(u.is_blocked) / COUNT(DISTINCT r.user_id), 1) as blocked_percentage
+    FROM revisions r
+    JOIN users u ON r.user_id = u.id
+    JOIN articles a ON r.article_id = a.id
+    WHERE a.title = ?
+"""
+
+ARTICLE_TOP_EDITOR = """
+    SELECT u.username, COUNT(r.id) as revision_count
+    FROM users u
+    JOIN revisions r ON u.id = r.user_id
+    JOIN articles a ON r.article_id = a.id
+    WHERE a.title = ?
+    GROUP BY u.id
+    ORDER BY revision_count DESC
+    LIMIT 1
+"""
+
+# --- dashboard.py, overview ---
+
+TOP_EDITOR = """
+    SELECT u.username, us.contributions as revision_count
+    FROM user_stats us
+    JOIN users u ON u.id = us.user_id
+    ORDER BY us.contributions DESC
+    LIMIT 1
+"""
+
+MOST_EDITED_ARTICLE = """
+    SELECT a.title, COUNT(r.id) as revision_count
+    FROM articles a
+    JOIN revisions r ON a.id = r.article_id
+    GROUP BY a.id
+    ORDER BY revision_count DESC
+    LIMIT 1
+"""
+
+LAST_REVISED_ARTICLE = """
+    SELECT a.title, r.timestamp
+    FROM (
+        SELECT article_id, timestamp FROM revisions
+        ORDER BY ts_epoch DESC
+        LIMIT 1
+    ) r
+    JOIN articles a ON r.article_id = a.id
+"""
+
+# --- dashboard.py, articles tab ---
+
+SELECTED_ARTICLES = """
+    SELECT a.id, a.title,
+           COUNT(r.id) AS revisions,
+           COUNT(DISTINCT r.user_id) AS unique_users,
+           MAX(r.timestamp) AS last_updated
+    FROM articles a
+    LEFT JOIN revisions r ON a.id = r.article_id
+    WHERE a.title IN ({titles})
+    GROUP BY a.id
+    ORDER BY revisions DESC
+"""
+
+TOP_ARTICLES = """
+    SELECT a.id, a.title,
+           COUNT(r.id) AS revisions,
+           COUNT(DISTINCT r.user_id) AS unique_users,
+           MAX(r.timestamp) AS last_updated
+    FROM articles a
+    LEFT JOIN revisions r ON a.id = r.article_id
+    GROUP BY a.id
+    HAVING revisions >= ?
+    ORDER BY revisions DESC
+    LIMIT 15
+"""
+
+# --- dashboard.py, revisions tab ---
+
+# r.day : numéro de jour UTC précalculé, la date n'est formatée qu'une fois par jour
+TIMELINE = """
+    SELECT date(r.day * 86400, 'unixepoch') as day, COUNT(*) as revisions
+    FROM revisions r
+    GROUP BY r.day
+    ORDER BY r.day
+"""
+
+ARTICLES_TIMELINE = """
+    SELECT a.title, date(r.day * 86400, 'unixepoch') as day, COUNT(*) as revisions
+    FROM revisions r
+    JOIN articles a ON r.article_id = a.id
+    WHERE a.title IN ({titles})
+    GROUP BY a.title, r.day
+    ORDER BY r.day
+"""
+
+TAGS = """
+    SELECT r.tags as tags_str
+    FROM revisions r
+    WHERE r.tags IS NOT NULL AND r.tags != ''
+"""
+
+ARTICLES_TAGS = """
+    SELECT r.tags as tags_str
+    FROM revisions r
+    JOIN articles a ON r.article_id = a.id
+    WHERE r.tags IS NOT NULL AND r.tags != ''
+    AND a.title IN ({titles})
+"""
+
+# --- dashboard.py, users tab ---
+
+# Tous les articles : compteurs maintenus par les triggers
+USERS_ACTIVITY = """
+    SELECT u.username,
+           us.contributions as revisions,
+           u.is_bot,
+           u.is_ip,
+           u.is_blocked
+    FROM user_stats us
+    JOIN users u ON u.id = us.user_id
+    WHERE us.contributions > 0
+    {bot_filter}
+    ORDER BY us.contributions DESC
+    LIMIT ?
+"""
+
+ARTICLES_USERS_ACTIVITY = """
+    SELECT u.username,
+           COUNT(r.id) as revisions,
+           u.is_bot,
+           u.is_ip,
+           u.is_blocked
+    FROM users u
+    LEFT JOIN revisions r ON u.id = r.user_id
+    JOIN articles a ON r.article_id = a.id WHERE a.title IN ({titles})
+    GROUP BY u.id
+    HAVING revisions > 0
+    {bot_filter}
+    ORDER BY revisions DESC
+    LIMIT ?
+"""
+
+# Un comptage par index plutôt qu'un parcours de la table
+USER_TYPES = """
+    SELECT
+        (SELECT COUNT(*) FROM users WHERE is_bot = 1) as "Bots",
+        (SELECT COUNT(*) FROM users WHERE is_ip = 1) as "Adresses IP",
+        (SELECT COUNT(*) FROM users WHERE is_blocked = 1) as "Bloqués",
+        (SELECT COUNT(*) FROM users WHERE is_bot = 0 AND is_ip = 0) as "Normaux"
+"""
+
+ARTICLES_USER_TYPES = """
+    SELECT
+        SUM(CASE WHEN u.is_bot = 1 THEN 1 ELSE 0 END) as "Bots",
+        SUM(CASE WHEN u.is_ip = 1 THEN 1 ELSE 0 END) as "Adresses IP",
+        SUM(CASE WHEN u.is_blocked = 1 THEN 1 ELSE 0 END) as "Bloqués",
+        SUM(CASE WHEN u.is_bot = 0 AND u.is_ip = 0 THEN 1 ELSE 0 END) as "Normaux"
+    FROM (
+        SELECT DISTINCT u.id, u.is_bot, u.is_ip, u.is_blocked
+        FROM users u
+        JOIN revisions r ON u.id = r.user_id
+        JOIN articles a ON r.article_id = a.id
+        WHERE a.title IN ({titles})
+    ) u
+"""
@@ -0,0 +1,165 @@
+import argparse
+import bz2
+import gzip
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from populate import init_db, update_database
+
+# Offline backfill from Wikimedia stub-meta-history XML dumps
+# (https://dumps.wikimedia.org/frwiki/). Produces the same rows as the API
+# ingest: revisions with size_change, and users with IP detection. Editors
+# are stored unscraped, rescrape_users fills in bot/blocked status later.
+# Stub dumps carry no change tags, so tags are left empty.
+
+DB_PATH = "wikipedia.db"
+# Revisions buffered before being handed to update_database
+IMPORT_BATCH_SIZE = 5000
+
+def open_dump(path):
+    """Open a dump file, transparently decompressing .bz2 and .gz files."""
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def _local_name(tag):
+    """Strip the export schema namespace, '{...}page' -> 'page'."""
+    return tag.rsplit("}", 1)[-1]
+
+def _child_text(elem, name):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return child.text
+    return None
+
+def _parse_revision(elem):
+    """Turn a <revision> element into the dict update_database expects."""
+    rev = {
+        "revision_id": None,
+        "parent_id": None,
+        "timestamp": None,
+        "user": None,
+        "comment": "",
+        "flags": "",
+        "size": None,
+        "tags": "",
+    }
+    for child in elem:
+        name = _local_name(child.tag)
+        if name == "id":
+            rev["revision_id"] = int(child.text)
+        elif name == "parentid":
+            rev["parent_id"] = int(child.text)
+        elif name == "timestamp":
+            rev["timestamp"] = child.text.replace('T', ' ').replace('Z', '')
+        elif name == "contributor":
+            # Registered users have <username>, anonymous edits an <ip>
+            rev["user"] = _child_text(child, "username") or _child_text(child, "ip")
+        elif name == "comment":
+            rev["comment"] = child.text or ""
+        elif name == "minor":
+            rev["flags"] = "minor"
+        elif name == "text":
+            size = child.get("bytes")
+            rev["size"] = int(size) if size is not None else None
+    return rev
+
+def iter_dump_pages(path, titles=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Stream a stub-meta-history dump and yield (title, revisions) batches of
+    at most batch_size revisions, in dump order. Pages whose title is not in
+    `titles` are skipped. Elements are cleared as soon as they are consumed,
+    so memory stays constant whatever the dump size.
+    """
+    with open_dump(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+
+        title = None
+        wanted = False
+        batch = []
+        # revision_id -> size for the current page, to compute size_change
+        sizes = {}
+        previous_size = None
+
+        for event, elem in context:
+            name = _local_name(elem.tag)
+            if event == "start":
+                if name == "page":
+                    title, wanted, sizes, previous_size = None, False, {}, None
+                continue
+
+            if name == "title" and title is None:
+                title = elem.text
+                wanted = titles is None or title in titles
+            elif name == "revision":
+                if wanted:
+                    rev = _parse_revision(elem)
+                    parent_size = sizes.get(rev["parent_id"], previous_size)
+                    rev["parent_size"] = parent_size
+                    rev["size_change"] = (
+                        rev["size"] - parent_size
+                        if rev["size"] is not None and parent_size is not None else None
+                    )
+                    sizes[rev["revision_id"]] = rev["size"]
+                    previous_size = rev["size"]
+                    batch.append(rev)
+                    if len(batch) >= batch_size:
+                        yield title, batch
+                        batch = []
+                elem.clear()
+            elif name == "page":
+                if batch:
+                    yield title, batch
+                    batch = []
+                # Drop the finished page from the tree
+                root.clear()
+
+def load_titles(conn, titles_file=None):
+    """Titles to import: from a file (one per line) or the scheduled articles."""
+    if titles_file:
+        with open(titles_file, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+    return {row[0] for row in conn.execute("SELECT title FROM scheduled_articles")}
+
+def import_dump(db_path, dump_path, titles=None, batch_size=IMPORT_BATCH_SIZE):
+    """Import the revisions of `titles` from a dump into the database."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    start = time.monotonic()
+    total_read = 0
+    total_inserted = 0
+    try:
+        for title, revisions in iter_dump_pages(dump_path, titles=titles, batch_size=batch_size):
+            stats = update_database(conn, title, revisions, scrape_users=False)
+            total_read += len(revisions)
+            total_inserted += stats['inserted'] if stats else 0
+            elapsed = time.monotonic() - start
+            print(f"[import_dump] {title}: {total_read} révisions lues, {total_inserted} insérées ({total_read / elapsed:.0f}/s)")
+    finally:
+        conn.close()
+    return total_read, total_inserted
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import a Wikimedia stub-meta-history XML dump.")
+    parser.add_argument("dump", help="Path to the dump (.xml, .xml.bz2 or .xml.gz)")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to fill")
+    parser.add_argument("--titles", nargs="*", help="Article titles to import")
+    parser.add_argument("--titles-file", help="File with one article title per line")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    init_db(args.db)
+    if args.titles:
+        titles = set(args.titles)
+    else:
+        conn = sqlite3.connect(args.db)
+        titles = load_titles(conn, args.titles_file)
+        conn.close()
+    if not titles:
+        parser.error("no titles to import: pass --titles/--titles-file or schedule some articles")
+
+    read, inserted = import_dump(args.db, args.dump, titles=titles, batch_size=args.batch_size)
+    print(f"[import_dump] Terminé : {read} révisions lues, {inserted} insérées.")
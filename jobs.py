@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from populate import populate_article
+from ratelimit import request_priority, INTERACTIVE
+
+# Persistent population job queue. Requests from the web routes are stored
+# in population_jobs and processed by a small pool of worker threads, so a
+# big article never ties up a web thread. A partial unique index keeps at
+# most one queued/running job per title: concurrent requests for the same
+# article share the in-flight job.
+
+JOB_WORKERS = 2
+# Seconds an idle worker waits before looking at the queue again
+JOB_POLL_INTERVAL = 5
+# Attempts at recording the outcome of a job, a second more between each
+JOB_STATUS_ATTEMPTS = 3
+
+_wakeup = threading.Event()
+_workers = []
+
+def enqueue_job(conn, title, priority=INTERACTIVE):
+    """
+    Queue the population of an article, or join the job already queued or
+    running for it. The job makes its API calls in the given rate limiter
+    priority class. Returns (job_id, created).
+    """
+    try:
+        cur = conn.execute(
+            "INSERT INTO population_jobs (title, status, created_at, priority) VALUES (?, 'queued', ?, ?)",
+            (title, datetime.now().isoformat(), priority)
+        )
+        conn.commit()
+        _wakeup.set()
+        return cur.lastrowid, True
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        row = conn.execute(
+            "SELECT id FROM population_jobs WHERE title = ? AND status IN ('queued', 'running')",
+            (title,)
+        ).fetchone()
+        if row is None:
+            # The in-flight job finished in between, queue a new one
+            return enqueue_job(conn, title, priority)
+        # A more urgent request promotes a job that has not started yet
+        conn.execute(
+            "UPDATE population_jobs SET priority = ? WHERE id = ? AND status = 'queued' AND priority > ?",
+            (priority, row[0], priority)
+        )
+        conn.commit()
+        return row[0], False
+
+def get_job(conn, job_id):
+    """Return a job with its estimated remaining time, or None."""
+    row = conn.execute("SELECT * FROM population_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+
+    job['eta_seconds'] = None
+    if job['status'] == 'running' and job['started_at'] and job['progress']:
+        elapsed = (datetime.now() - datetime.fromisoformat(job['started_at'])).total_seconds()
+        job['eta_seconds'] = round(elapsed * (1 - job['progress']) / job['progress'])
+    elif job['status'] == 'done':
+        job['eta_seconds'] = 0
+    return job
+
+def _claim_job(conn):
+    """Atomically move the most urgent, then oldest, queued job to running and return it."""
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute(
+        "SELECT id, title, priority FROM population_jobs WHERE status = 'queued' ORDER BY priority, id LIMIT 1"
+    ).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE population_jobs SET status = 'running', started_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), row['id'])
+        )
+    conn.commit()
+    return row
+
+def _history_progress(first_timestamp, last_timestamp):
+    """
+    Share of the history already fetched. Pages come oldest first, so the
+    time span covered so far over the span up to now is a fair estimate.
+    """
+    first = datetime.fromisoformat(first_timestamp)
+    covered = (datetime.fromisoformat(last_timestamp) - first).total_seconds()
+    # Revision timestamps are stored in UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    total = (now - first).total_seconds()
+    return min(1.0, covered / total) if total > 0 else 1.0
+
+def run_job(conn, job):
+    """Populate the article of a claimed job, reporting progress per page."""
+    progress = {'pages': 0, 'written': 0, 'first_timestamp': None}
+
+    def on_page(revisions, stats):
+        progress['pages'] += 1
+        progress['written'] += stats['inserted'] if stats else 0
+        if progress['first_timestamp'] is None:
+            progress['first_timestamp'] = revisions[0]['timestamp']
+        conn.execute("""
+            UPDATE population_jobs
+            SET pages_fetched = ?, revisions_written = ?, progress = ?
+            WHERE id = ?
+        """, (
+            progress['pages'],
+            progress['written'],
+            _history_progress(progress['first_timestamp'], revisions[-1]['timestamp']),
+            job['id']
+        ))
+        conn.commit()
+
+    try:
+        with request_priority(job['priority']):
+            populate_article(conn, job['title'], on_page=on_page)
+    except Exception as e:
+        conn.rollback()
+        print(f"[run_job] Erreur pour {job['title']}: {str(e)}")
+        _finish_job(conn, job, str(e))
+        return
+    _finish_job(conn, job)
+
+def _finish_job(conn, job, error=None):
+    """
+    Record the outcome of a job, retried on database errors (locks): a job
+    left 'running' keeps its title's in-flight slot until the next restart.
+    """
+    for attempt in range(1, JOB_STATUS_ATTEMPTS + 1):
+        try:
+            if error is None:
+                conn.execute(
+                    "UPDATE scheduled_articles SET last_populated = datetime('now') WHERE title = ?",
+                    (job['title'],)
+                )
+                conn.execute(
+                    "UPDATE population_jobs SET status = 'done', progress = 1, finished_at = ? WHERE id = ?",
+                    (datetime.now().isoformat(), job['id'])
+                )
+            else:
+                conn.execute(
+                    "UPDATE population_jobs SET status = 'error', error = ?, finished_at = ? WHERE id = ?",
+                    (error, datetime.now().isoformat(), job['id'])
+                )
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"[jobs] Statut du job {job['id']} non enregistré (essai {attempt}/{JOB_STATUS_ATTEMPTS}): {str(e)}")
+            if attempt < JOB_STATUS_ATTEMPTS:
+                time.sleep(attempt)
+    print(f"[jobs] Job {job['id']} laissé 'running', il sera relancé au prochain démarrage")
+    return False
+
+def _worker_loop(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    while True:
+        try:
+            job = _claim_job(conn)
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"[jobs] Erreur de la file: {str(e)}")
+            job = None
+
+        if job is None:
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        print(f"[jobs] Job {job['id']} : {job['title']}")
+        start = time.monotonic()
+        try:
+            run_job(conn, job)
+        except Exception as e:
+            # Never let a job end the worker thread
+            conn.rollback()
+            print(f"[jobs] Job {job['id']} interrompu: {str(e)}")
+            continue
+        print(f"[jobs] Job {job['id']} terminé en {time.monotonic() - start:.1f}s")
+
+def start_workers(db_path, count=JOB_WORKERS):
+    """
+    Start the worker threads once per process. Jobs left running by a
+    previous process are queued again; populate_article resumes them from
+    their ingest checkpoint.
+    """
+    if _workers:
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("UPDATE population_jobs SET status = 'queued' WHERE status = 'running'")
+    conn.commit()
+    conn.close()
+
+    for _ in range(count):
+        worker = threading.Thread(target=_worker_loop, args=(db_path,), daemon=True)
+        worker.start()
+        _workers.append(worker)
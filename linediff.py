@@ -0,0 +1,90 @@
+from bisect import bisect_left
+from difflib import SequenceMatcher
+
+# Line diff for generate_diff. Lines are interned to integers, then aligned
+# with patience diff: lines occurring once on both sides are used as
+# anchors (longest increasing subsequence), and the gaps between anchors
+# are diffed again the same way. Common prefixes and suffixes are trimmed
+# at every step, so unchanged parts of an article cost a single pass.
+# Gaps without any unique line (repeated template rows...) are handed to
+# difflib's SequenceMatcher, on the integer ids rather than the text.
+
+def intern_lines(old_lines, new_lines):
+    """Map each distinct line to an integer, returns the two id lists."""
+    ids = {}
+    old_ids = [ids.setdefault(line, len(ids)) for line in old_lines]
+    new_ids = [ids.setdefault(line, len(ids)) for line in new_lines]
+    return old_ids, new_ids
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Longest chain of (i, j) pairs matching lines unique on both sides."""
+    counts = {}
+    for i in range(alo, ahi):
+        counts[a[i]] = counts.get(a[i], 0) + 1
+    positions = {}
+    for j in range(blo, bhi):
+        if counts.get(b[j]) == 1:
+            positions[b[j]] = None if b[j] in positions else j
+    pairs = [(i, positions[a[i]]) for i in range(alo, ahi)
+             if counts[a[i]] == 1 and positions.get(a[i]) is not None]
+
+    # Patience sorting on the new-side positions
+    tails = []
+    tail_index = []
+    previous = [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        if pile == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pile] = j
+            tail_index[pile] = k
+        previous[k] = tail_index[pile - 1] if pile else None
+
+    chain = []
+    k = tail_index[-1] if tail_index else None
+    while k is not None:
+        chain.append(pairs[k])
+        k = previous[k]
+    return chain[::-1]
+
+def diff_lines(old_lines, new_lines):
+    """
+    Changed lines between two lists of lines, in order, as ('-', line) for
+    removed lines and ('+', line) for added ones. Unchanged lines are not
+    returned.
+    """
+    a, b = intern_lines(old_lines, new_lines)
+    changes = []
+    # Regions still to diff, the last one is processed first
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi) if alo < ahi and blo < bhi else []
+        if not anchors:
+            if alo < ahi and blo < bhi:
+                matcher = SequenceMatcher(None, a[alo:ahi], b[blo:bhi])
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    if tag != 'equal':
+                        changes.extend(('-', old_lines[alo + i]) for i in range(i1, i2))
+                        changes.extend(('+', new_lines[blo + j]) for j in range(j1, j2))
+            else:
+                changes.extend(('-', old_lines[i]) for i in range(alo, ahi))
+                changes.extend(('+', new_lines[j]) for j in range(blo, bhi))
+            continue
+
+        gaps = []
+        for i, j in anchors:
+            gaps.append((alo, i, blo, j))
+            alo, blo = i + 1, j + 1
+        gaps.append((alo, ahi, blo, bhi))
+        stack.extend(reversed(gaps))
+    return changes
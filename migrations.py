@@ -0,0 +1,370 @@
+import argparse
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+import hot_queries
+
+# Versioned schema changes. init_db creates the tables and triggers, then
+# migrate() applies the migrations newer than the version recorded in
+# schema_version, each in its own transaction, and refreshes the planner
+# statistics (ANALYZE) when something was applied. A shipped migration is
+# never edited: further changes go in a new one at the end of MIGRATIONS.
+# A migration is a list of statements, or a function for data changes too
+# large for one transaction (it commits in chunks and must be re-runnable).
+#
+# check_query_plans() runs EXPLAIN QUERY PLAN on the hot queries of
+# queries.py, app.py and dashboard.py (their SQL lives in hot_queries.py)
+# and reports every full table scan.
+# Usage: python migrations.py [--db wikipedia.db] [--analyze] [--check]
+
+DB_PATH = "wikipedia.db"
+# Rows sampled per index by ANALYZE, keeps it fast on large databases
+ANALYSIS_LIMIT = 1000
+# Tables small enough to be scanned: one row per tracked article
+SMALL_TABLES = ("articles",)
+# Rows per transaction when backfilling a new column
+BACKFILL_CHUNK_SIZE = 10000
+# revisions.day is the UTC day number, ts_epoch // SECONDS_PER_DAY
+SECONDS_PER_DAY = 86400
+
+def epoch_seconds(timestamp):
+    """Unix time of a stored UTC timestamp ('2024-01-02 03:04:05'), None if missing."""
+    if not timestamp:
+        return None
+    moment = datetime.fromisoformat(timestamp.replace('Z', ''))
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+def day_bucket(epoch):
+    """UTC day number of a Unix time, as stored in revisions.day."""
+    return None if epoch is None else epoch // SECONDS_PER_DAY
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _backfill(conn, table, assignments, condition):
+    """UPDATE `table` by rowid ranges, one transaction per BACKFILL_CHUNK_SIZE rows."""
+    first, last = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table} WHERE {condition}").fetchone()
+    if first is None:
+        return
+    updated = 0
+    for low in range(first, last + 1, BACKFILL_CHUNK_SIZE):
+        with conn:
+            updated += conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE rowid >= ? AND rowid < ? AND {condition}",
+                (low, low + BACKFILL_CHUNK_SIZE)
+            ).rowcount
+    print(f"[migrate] {table} : {updated} lignes complétées")
+
+def _add_epoch_columns(conn):
+    """
+    Integer copies of the time columns: Unix seconds and UTC day number of
+    each revision, Unix seconds of users.last_updated and of the last edit
+    in user_stats. Written by populate from then on, backfilled here.
+    """
+    added = {
+        'revisions': ("ts_epoch INTEGER", "day INTEGER"),
+        'users': ("last_updated_epoch INTEGER",),
+        'user_stats': ("last_edit_epoch INTEGER",),
+    }
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table, columns in added.items():
+            existing = _columns(conn, table)
+            for column in columns:
+                if column.split()[0] not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    # Stored timestamps are UTC, last_updated is local time (datetime.now())
+    _backfill(conn, "revisions",
+              f"ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER), "
+              f"day = CAST(strftime('%s', timestamp) AS INTEGER) / {SECONDS_PER_DAY}",
+              "ts_epoch IS NULL AND timestamp IS NOT NULL")
+    _backfill(conn, "users",
+              "last_updated_epoch = CAST(strftime('%s', last_updated, 'utc') AS INTEGER)",
+              "last_updated_epoch IS NULL AND last_updated IS NOT NULL")
+    _backfill(conn, "user_stats",
+              "last_edit_epoch = CAST(strftime('%s', last_edit) AS INTEGER)",
+              "last_edit_epoch IS NULL AND last_edit IS NOT NULL")
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, "Index existants avant le versionnage du schéma", [
+        "CREATE INDEX IF NOT EXISTS index_users_scraped ON users(is_scraped)",
+        "CREATE INDEX IF NOT EXISTS index_revisions_scraped ON revisions(is_scraped)",
+        "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_population_jobs_inflight
+            ON population_jobs(title) WHERE status IN ('queued', 'running')""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_classifications_prompt ON classifications(prompt_hash, model)",
+        "CREATE INDEX IF NOT EXISTS idx_classifications_user ON classifications(username, checked_at)",
+        "CREATE INDEX IF NOT EXISTS idx_user_stats_contributions ON user_stats(contributions)",
+        # Same expressions as the keyset sort keys of queries.fetch_users
+        "CREATE INDEX IF NOT EXISTS idx_user_stats_last_edit ON user_stats(COALESCE(last_edit, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_user_stats_first_edit ON user_stats(COALESCE(first_edit, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_user_article_stats_article ON user_article_stats(article_id, contributions, user_id)",
+        # Keyset pagination of the article and user revision listings
+        "CREATE INDEX IF NOT EXISTS idx_revisions_article_time ON revisions(article_id, timestamp, revision_id)",
+        "CREATE INDEX IF NOT EXISTS idx_revisions_user_time ON revisions(user_id, timestamp, revision_id)",
+    ]),
+    (2, "Recherche par préfixe de nom d'utilisateur", [
+        # UNIQUE(username) already has its own index
+        "DROP INDEX IF EXISTS idx_users_username",
+        # Serves "username LIKE 'abc%'", LIKE being case-insensitive
+        "CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)",
+    ]),
+    (3, "Index des filtres utilisateurs et des statistiques du dashboard", [
+        "CREATE INDEX IF NOT EXISTS idx_users_bot ON users(is_bot)",
+        "CREATE INDEX IF NOT EXISTS idx_users_ip ON users(is_ip)",
+        "CREATE INDEX IF NOT EXISTS idx_users_blocked ON users(is_blocked)",
+        # Latest revision and global timeline
+        "CREATE INDEX IF NOT EXISTS idx_revisions_timestamp ON revisions(timestamp)",
+        # Tag distribution, read from the index alone
+        "CREATE INDEX IF NOT EXISTS idx_revisions_tags ON revisions(tags)",
+    ]),
+    (4, "Colonnes de temps entières (secondes Unix, jour)", _add_epoch_columns),
+    (5, "Index des colonnes de temps entières", [
+        "CREATE INDEX IF NOT EXISTS idx_revisions_ts_epoch ON revisions(ts_epoch)",
+        # Timelines: global, and per article
+        "CREATE INDEX IF NOT EXISTS idx_revisions_day ON revisions(day)",
+        "CREATE INDEX IF NOT EXISTS idx_revisions_article_day ON revisions(article_id, day)",
+        "CREATE INDEX IF NOT EXISTS idx_users_last_updated_epoch ON users(last_updated_epoch)",
+        "CREATE INDEX IF NOT EXISTS idx_user_stats_last_edit_epoch ON user_stats(last_edit_epoch)",
+        # Replaced by idx_revisions_ts_epoch
+        "DROP INDEX IF EXISTS idx_revisions_timestamp",
+        # user_stats.last_edit_epoch follows the inserted revisions too.
+        # Rows skipped by INSERT OR IGNORE do not fire AFTER INSERT triggers
+        "DROP TRIGGER IF EXISTS trg_revisions_stats",
+        """CREATE TRIGGER trg_revisions_stats AFTER INSERT ON revisions
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+            INSERT INTO user_article_stats (user_id, article_id, contributions, first_edit, last_edit)
+            VALUES (NEW.user_id, NEW.article_id, 1, NEW.timestamp, NEW.timestamp)
+            ON CONFLICT(user_id, article_id) DO UPDATE SET
+                contributions = contributions + 1,
+                first_edit = MIN(COALESCE(first_edit, excluded.first_edit), COALESCE(excluded.first_edit, first_edit)),
+                last_edit = MAX(COALESCE(last_edit, excluded.last_edit), COALESCE(excluded.last_edit, last_edit));
+
+            INSERT INTO user_stats (user_id, contributions, first_edit, last_edit, last_edit_epoch, articles)
+            VALUES (NEW.user_id, 1, NEW.timestamp, NEW.timestamp, NEW.ts_epoch, 1)
+            ON CONFLICT(user_id) DO UPDATE SET
+                contributions = contributions + 1,
+                first_edit = MIN(COALESCE(first_edit, excluded.first_edit), COALESCE(excluded.first_edit, first_edit)),
+                last_edit = MAX(COALESCE(last_edit, excluded.last_edit), COALESCE(excluded.last_edit, last_edit)),
+                last_edit_epoch = MAX(COALESCE(last_edit_epoch, excluded.last_edit_epoch), COALESCE(excluded.last_edit_epoch, last_edit_epoch)),
+                -- First revision of this user on this article
+                articles = articles + (
+                    SELECT contributions = 1 FROM user_article_stats
+                    WHERE user_id = NEW.user_id AND article_id = NEW.article_id
+                );
+        END""",
+    ]),
+    (6, "Priorité des jobs de population", [
+        # ratelimit.INTERACTIVE: the jobs queued before were all run at that priority
+        "ALTER TABLE population_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+def schema_version(conn):
+    """Current schema version, 0 for a database never migrated."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def analyze(conn):
+    """Refresh the statistics the query planner uses to pick indexes."""
+    start = time.monotonic()
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.commit()
+    print(f"[analyze] Statistiques mises à jour en {time.monotonic() - start:.2f}s")
+
+def migrate(conn):
+    """Apply the pending migrations. Returns the schema version."""
+    version = schema_version(conn)
+    conn.commit()
+    applied = 0
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        start = time.monotonic()
+        if callable(statements):
+            statements(conn)
+            statements = []
+        # IMMEDIATE: a concurrent process applying the same migration waits
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= number:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, datetime('now'))",
+                (number, description)
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        version = number
+        applied += 1
+        print(f"[migrate] Migration {number} appliquée ({description}) en {time.monotonic() - start:.2f}s")
+
+    # Statistics of empty tables would mislead the planner once filled
+    if applied and conn.execute("SELECT EXISTS (SELECT 1 FROM revisions)").fetchone()[0]:
+        analyze(conn)
+    return version
+
+# The SQL of app.py and dashboard.py, with the sample values bound in order
+HOT_QUERIES = [
+    ("app.article_detail", hot_queries.ARTICLE_REVISION_COUNT, ("title",)),
+    ("app.user_infos", hot_queries.USER_BY_NAME, ("username",)),
+    ("app.user_infos stats", hot_queries.USER_STATS, ("user_id",)),
+    ("app.api_search articles", hot_queries.SEARCH_ARTICLES, ("prefix",)),
+    ("app.api_search users", hot_queries.SEARCH_USERS, ("prefix",)),
+    ("dashboard article stats", hot_queries.ARTICLE_STATS, ("title",)),
+    ("dashboard article users", hot_queries.ARTICLE_USER_SHARES, ("title",)),
+    ("dashboard article top editor", hot_queries.ARTICLE_TOP_EDITOR, ("title",)),
+    ("dashboard top editor", hot_queries.TOP_EDITOR, ()),
+    ("dashboard most edited article", hot_queries.MOST_EDITED_ARTICLE, ()),
+    ("dashboard last revised", hot_queries.LAST_REVISED_ARTICLE, ()),
+    ("dashboard selected articles", hot_queries.SELECTED_ARTICLES, ("title",)),
+    ("dashboard top articles", hot_queries.TOP_ARTICLES, ("min_revisions",)),
+    ("dashboard timeline", hot_queries.TIMELINE, ()),
+    ("dashboard article timeline", hot_queries.ARTICLES_TIMELINE, ("title",)),
+    ("dashboard tags", hot_queries.TAGS, ()),
+    ("dashboard article tags", hot_queries.ARTICLES_TAGS, ("title",)),
+    ("dashboard users", hot_queries.USERS_ACTIVITY, ("limit",)),
+    ("dashboard article users activity", hot_queries.ARTICLES_USERS_ACTIVITY, ("title", "limit")),
+    ("dashboard user types", hot_queries.USER_TYPES, ()),
+    ("dashboard article user types", hot_queries.ARTICLES_USER_TYPES, ("title",)),
+]
+
+def _hot_query_variants(params):
+    """HOT_QUERIES for one selected article, with and without the bot filter."""
+    for name, sql, keys in HOT_QUERIES:
+        bot_filters = ("", hot_queries.BOT_FILTER) if "{bot_filter}" in sql else ("",)
+        for bot_filter in bot_filters:
+            yield (name + (" sans bots" if bot_filter else ""),
+                   sql.format(titles="?", bot_filter=bot_filter),
+                   tuple(params[key] for key in keys))
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+_SQL_WORDS = {"WHERE", "JOIN", "LEFT", "INNER", "ON", "GROUP", "ORDER", "LIMIT", "HAVING", "AND", "USING"}
+
+def _tables(sql):
+    """Alias (or name) -> table of the tables a query reads."""
+    tables = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        tables[table] = table
+        if alias and alias.upper() not in _SQL_WORDS:
+            tables[alias] = table
+    return tables
+
+def full_scans(conn, sql, params=()):
+    """Plan lines of `sql` that read a whole table without an index."""
+    tables = _tables(sql)
+    # Subqueries in FROM, already limited by their own plan
+    subqueries = set()
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[3]
+        match = re.match(r"(MATERIALIZE|CO-ROUTINE) (\w+)$", detail)
+        if match:
+            subqueries.add(match.group(2))
+            continue
+        match = re.match(r"SCAN (\w+)$", detail)
+        if match and match.group(1) not in subqueries \
+                and tables.get(match.group(1), match.group(1)) not in SMALL_TABLES:
+            scans.append(detail)
+    return scans
+
+def _traced_queries(conn, title, user_id):
+    """The statements run by the listings of queries.py, first and second pages."""
+    import queries
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        for fetch in (
+            lambda cursor: queries.fetch_revisions_db(conn, title, 25, cursor),
+            lambda cursor: queries.fetch_user_revisions(conn, user_id, 25, cursor),
+            lambda cursor: queries.fetch_articles(conn, 25, cursor),
+        ):
+            _, next_cursor, _ = fetch(None)
+            fetch(next_cursor)
+        for filters in ({}, {'bots_only': True}, {'ips_only': True}, {'blocked_only': True},
+                        {'active_within_days': 30}, {'article_title': title}):
+            for sort in ('contributions', 'newest', 'oldest'):
+                _, next_cursor, _ = queries.fetch_users(conn, limit=25, sort=sort, **filters)
+                queries.fetch_users(conn, limit=25, cursor=next_cursor, sort=sort, **filters)
+            queries.count_users(conn, **filters)
+    finally:
+        conn.set_trace_callback(None)
+    # Parameters are inlined in the traced text
+    return [(f"queries #{number}", statement, {}) for number, statement in enumerate(dict.fromkeys(statements), 1)]
+
+def check_query_plans(conn):
+    """
+    EXPLAIN QUERY PLAN of the hot queries on this database. Returns
+    [(name, sql, scans)] of the queries doing full table scans, empty
+    when all of them use indexes.
+    """
+    conn.row_factory = sqlite3.Row
+    sample = conn.execute("""
+        SELECT a.title, u.id AS user_id, u.username
+        FROM revisions r
+        JOIN articles a ON a.id = r.article_id
+        JOIN users u ON u.id = r.user_id
+        ORDER BY r.id DESC
+        LIMIT 1
+    """).fetchone()
+    if not sample:
+        raise ValueError("check_query_plans needs a database with revisions")
+    params = dict(sample)
+    params.update(prefix=params['username'][:3] + '%', limit=20, min_revisions=10)
+
+    failures = []
+    checked = list(_hot_query_variants(params))
+    checked += _traced_queries(conn, params['title'], params['user_id'])
+    for name, sql, query_params in checked:
+        scans = full_scans(conn, sql, query_params)
+        if scans:
+            failures.append((name, " ".join(sql.split()), scans))
+    print(f"[check_query_plans] {len(checked)} requêtes vérifiées, {len(failures)} avec un parcours complet de table")
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migrate the database schema and check the query plans.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to migrate")
+    parser.add_argument("--check", action="store_true", help="Fail if a hot query does a full table scan")
+    parser.add_argument("--analyze", action="store_true", help="Refresh the planner statistics first")
+    args = parser.parse_args()
+
+    from populate import init_db
+    init_db(args.db)
+    conn = sqlite3.connect(args.db)
+    try:
+        print(f"[migrate] Schéma en version {schema_version(conn)}")
+        # Without --analyze the plans are checked on the statistics init_db
+        # leaves, the ones the app starts with
+        if args.analyze:
+            analyze(conn)
+        if args.check:
+            failures = check_query_plans(conn)
+            for name, sql, scans in failures:
+                print(f"[check_query_plans] {name}: {', '.join(scans)}\n    {sql}")
+            if failures:
+                sys.exit(1)
+    finally:
+        conn.close()
@@ -1,13 +1,34 @@
 import sqlite3
-import requests
+import json
 import re
 import ipaddress
-from datetime import datetime, timedelta
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from migrations import SECONDS_PER_DAY, analyze, day_bucket, epoch_seconds, migrate
+from ratelimit import current_priority, request_priority
+from wikiapi import api_get
 
-API_URL = "https://fr.wikipedia.org/w/api.php"
+# MediaWiki accepts at most 50 names per list=users request
+USERS_PER_REQUEST = 50
+# ... and at most 50 titles per prop=info request
+TITLES_PER_REQUEST = 50
+# Rows per executemany/transaction when writing revisions
+REVISION_CHUNK_SIZE = 1000
+# Keeps IN (...) lists well under SQLite's bound parameter limit
+SQL_IN_CHUNK_SIZE = 500
+# Articles fetched in parallel by populate_articles
+POPULATE_WORKERS = 4
+# Seconds a rescrape_users run may spend before leaving the rest for later
+RESCRAPE_TIME_BUDGET = 600
+
+# (database file, username) -> (users.id, last_updated) of scraped users,
+# shared by every ingest run of the process
+_user_id_cache = {}
 
 def init_db(db_path):
-    """Create tables if they don't exist."""
+    """Create tables if they don't exist, then apply the pending schema migrations."""
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
@@ -54,6 +75,80 @@ def init_db(db_path):
         is_active INTEGER DEFAULT 1
     );
                          
+    CREATE TABLE IF NOT EXISTS population_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT,
+        duration_seconds REAL,
+        status TEXT CHECK(status IN ('success', 'error')),
+        revisions_fetched INTEGER DEFAULT 0,
+        revisions_inserted INTEGER DEFAULT 0,
+        error TEXT
+    );
+                         
+    CREATE TABLE IF NOT EXISTS feed_cursors (
+        name TEXT PRIMARY KEY,
+        rcstart TEXT,
+        rccontinue TEXT,
+        updated_at TEXT
+    );
+                         
+    CREATE TABLE IF NOT EXISTS population_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        status TEXT CHECK(status IN ('queued', 'running', 'done', 'error')),
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        pages_fetched INTEGER DEFAULT 0,
+        revisions_written INTEGER DEFAULT 0,
+        progress REAL DEFAULT 0,
+        error TEXT
+    );
+                         
+    CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+        title TEXT PRIMARY KEY,
+        since_revision_id INTEGER,
+        continue_token TEXT,
+        previous_size INTEGER,
+        last_revision_id INTEGER,
+        last_timestamp TEXT,
+        pages_committed INTEGER DEFAULT 0,
+        updated_at TEXT
+    );
+
+    -- Per-user aggregates for the users list, kept up to date by the
+    -- triggers below on every inserted revision
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        contributions INTEGER NOT NULL DEFAULT 0,
+        first_edit TEXT,
+        last_edit TEXT,
+        articles INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS user_article_stats (
+        user_id INTEGER NOT NULL,
+        article_id INTEGER NOT NULL,
+        contributions INTEGER NOT NULL DEFAULT 0,
+        first_edit TEXT,
+        last_edit TEXT,
+        PRIMARY KEY (user_id, article_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS classifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        model TEXT NOT NULL,
+        revision_ids TEXT,
+        raw_response TEXT,
+        classification TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        checked_at TEXT NOT NULL
+    );
+                         
     CREATE TABLE IF NOT EXISTS auth_users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT UNIQUE NOT NULL,
@@ -62,15 +157,49 @@ def init_db(db_path):
         is_approved BOOLEAN DEFAULT 0,
         is_admin BOOLEAN DEFAULT 0
     );
-    
-    CREATE INDEX IF NOT EXISTS index_users_scraped ON users(is_scraped);
-    CREATE INDEX IF NOT EXISTS index_revisions_scraped ON revisions(is_scraped);
-    CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+
+    -- Every user has a stats row, so the users list can be read from user_stats
+    CREATE TRIGGER IF NOT EXISTS trg_users_stats AFTER INSERT ON users
+    BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.id);
+    END;
     """)
 
+    # Indexes, later columns and trg_revisions_stats are versioned in migrations.py
+    migrate(conn)
+
+    # Databases created before user_stats existed are backfilled once
+    if cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM user_stats) AND EXISTS (SELECT 1 FROM users)").fetchone()[0]:
+        rebuild_user_stats(conn)
+        # migrate() analyzed user_stats while it was still empty
+        analyze(conn)
+
     conn.commit()
     conn.close()
 
+def rebuild_user_stats(conn):
+    """Recompute user_stats and user_article_stats from the revisions table."""
+    start = time.monotonic()
+    with conn:
+        conn.execute("DELETE FROM user_article_stats")
+        conn.execute("DELETE FROM user_stats")
+        conn.execute("""
+            INSERT INTO user_article_stats (user_id, article_id, contributions, first_edit, last_edit)
+            SELECT user_id, article_id, COUNT(*), MIN(timestamp), MAX(timestamp)
+            FROM revisions
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id, article_id
+        """)
+        conn.execute("""
+            INSERT INTO user_stats (user_id, contributions, first_edit, last_edit, last_edit_epoch, articles)
+            SELECT u.id, COALESCE(SUM(s.contributions), 0), MIN(s.first_edit), MAX(s.last_edit),
+                   CAST(strftime('%s', MAX(s.last_edit)) AS INTEGER), COUNT(s.article_id)
+            FROM users u
+            LEFT JOIN user_article_stats s ON s.user_id = u.id
+            GROUP BY u.id
+        """)
+    print(f"[rebuild_user_stats] Statistiques utilisateurs recalculées en {time.monotonic() - start:.1f}s")
+
 def validate_wiki_title(title):
     """
     Validate Wikipedia article title according to Wikipedia's rules.
@@ -93,44 +222,74 @@ def validate_wiki_title(title):
         
     return title
 
-def fetch_revisions_from_api(title):
-    """Fetch all revisions of a Wikipedia article using the MediaWiki API."""
+def get_latest_stored_revision(conn, article_title):
+    """Return the newest stored revision (revision_id, timestamp) of an article, or None."""
+    return conn.execute("""
+        SELECT r.revision_id, r.timestamp
+        FROM revisions r
+        JOIN articles a ON a.id = r.article_id
+        WHERE a.title = ?
+        ORDER BY r.timestamp DESC, r.revision_id DESC
+        LIMIT 1
+    """, (article_title,)).fetchone()
+
+def iter_revision_pages(title, since_revision_id=None, cursor=None):
+    """
+    Yield the revisions of a Wikipedia article one API page at a time,
+    oldest first, so callers can persist each page before the next one is
+    fetched. With since_revision_id, only the revisions newer than that one
+    are yielded (delta mode).
+    cursor, if given, is a dict kept up to date before each yield with the
+    'continue' parameters of the next page and the 'previous_size' carried
+    over; passing a saved cursor back resumes the pagination from there.
+    """
     clean_title = validate_wiki_title(title)
     if not clean_title:
         print(f"[fetch_revisions] Invalid title: {title}")
-        return []
+        return
     
-    session = requests.Session()
     params = {
         "action": "query",
         "prop": "revisions",
         "titles": clean_title,
         "rvlimit": "max",
+        "rvdir": "newer",
         "rvprop": "ids|timestamp|user|comment|flags|size|tags",
         "formatversion": "2",
-        "format": "json",
         "continue": ""
     }
+    if since_revision_id:
+        # Walk forward from the newest stored revision. rvstartid is
+        # inclusive: the stored revision comes back first and only serves
+        # as the size reference of the oldest new revision.
+        params["rvstartid"] = since_revision_id
+        print(f"[fetch_revisions] Mode delta depuis la révision {since_revision_id}")
 
-    revisions = []
     total_fetched = 0
+    # Size of the previous revision in the stream, carried across pages so
+    # the first revision of a page still gets its size_change
+    previous_size = None
+    if cursor and cursor.get('continue'):
+        params.update(cursor['continue'])
+        previous_size = cursor.get('previous_size')
+        print("[fetch_revisions] Reprise depuis le dernier point de contrôle")
 
     while True:
         print("[fetch_revisions] Envoi de la requête API…")
-        resp = session.get(API_URL, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+        data = api_get(params, endpoint='revisions')
 
         pages = data.get("query", {}).get("pages", [])
         if not pages or "revisions" not in pages[0]:
             break
 
-        for i, rev in enumerate(pages[0]["revisions"]):
+        revisions = []
+        for rev in pages[0]["revisions"]:
             raw_timestamp = rev.get("timestamp")
             clean_timestamp = raw_timestamp.replace('T', ' ').replace('Z', '') if raw_timestamp else None
-            parent_size = None
-            if i < len(pages[0]["revisions"]) - 1:
-                parent_size = pages[0]["revisions"][i + 1]["size"]
+            parent_size = previous_size
+            previous_size = rev['size']
+            if rev.get("revid") == since_revision_id:
+                continue
             revisions.append({
                 "revision_id": rev.get("revid"),
                 "parent_id": rev.get("parentid"),
@@ -144,7 +303,13 @@ def fetch_revisions_from_api(title):
                 "size_change": rev['size'] - parent_size if parent_size is not None else None,  # Différence de taille
                 "tags": ','.join(rev.get('tags', []))
             })
-            total_fetched += 1
+
+        total_fetched += len(revisions)
+        if cursor is not None:
+            cursor['continue'] = data.get('continue')
+            cursor['previous_size'] = previous_size
+        if revisions:
+            yield revisions
 
         if 'continue' in data:
             print("[fetch_revisions] Suite paginée, chargement…")
@@ -152,101 +317,515 @@ def fetch_revisions_from_api(title):
         else:
             break
 
-    print(f"[fetch_revisions] Récupérées : {len(revisions)} révisions.")
-    return revisions
+    print(f"[fetch_revisions] Récupérées : {total_fetched} révisions.")
+
+def fetch_revisions_from_api(title, since_revision_id=None):
+    """Fetch all revisions of a Wikipedia article using the MediaWiki API."""
+    return [
+        rev
+        for page in iter_revision_pages(title, since_revision_id=since_revision_id)
+        for rev in page
+    ]
+
+def load_checkpoint(conn, article_title):
+    """Return the saved ingest position of an article, or None."""
+    row = conn.execute(
+        "SELECT * FROM ingest_checkpoints WHERE title = ?", (article_title,)
+    ).fetchone()
+    if row is None:
+        return None
+    checkpoint = dict(row)
+    checkpoint['continue'] = json.loads(row['continue_token'])
+    return checkpoint
+
+def save_checkpoint(conn, article_title, since_revision_id, cursor, revisions):
+    """Remember where the pagination of an article stands after a stored page."""
+    conn.execute("""
+        INSERT INTO ingest_checkpoints
+        (title, since_revision_id, continue_token, previous_size, last_revision_id, last_timestamp, pages_committed, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+        ON CONFLICT(title) DO UPDATE SET
+            continue_token = excluded.continue_token,
+            previous_size = excluded.previous_size,
+            last_revision_id = excluded.last_revision_id,
+            last_timestamp = excluded.last_timestamp,
+            pages_committed = pages_committed + 1,
+            updated_at = excluded.updated_at
+    """, (
+        article_title, since_revision_id, json.dumps(cursor['continue']),
+        cursor['previous_size'], revisions[-1]['revision_id'], revisions[-1]['timestamp'],
+        datetime.now().isoformat()
+    ))
+    conn.commit()
+
+def clear_checkpoint(conn, article_title):
+    conn.execute("DELETE FROM ingest_checkpoints WHERE title = ?", (article_title,))
+    conn.commit()
+
+def resume_point(conn, article_title):
+    """
+    Where to start fetching an article: from its checkpoint if a previous
+    run was interrupted, otherwise after the newest stored revision.
+    Returns (since_revision_id, cursor).
+    """
+    checkpoint = load_checkpoint(conn, article_title)
+    if checkpoint and checkpoint['continue']:
+        print(f"[populate_article] Reprise de '{article_title}' après {checkpoint['pages_committed']} pages")
+        return checkpoint['since_revision_id'], {
+            'continue': checkpoint['continue'],
+            'previous_size': checkpoint['previous_size'],
+        }
+    # Only ask the API for what was edited since the last run
+    latest = get_latest_stored_revision(conn, article_title)
+    return (latest['revision_id'] if latest else None), {}
+
+def populate_article(conn, article_title, on_page=None):
+    """
+    Stream the new revisions of an article into the database, committing
+    after every API page. Memory stays bounded by one page whatever the
+    history length. The pagination position is checkpointed after each
+    page, so an interrupted run is resumed exactly where it stopped.
+    on_page(revisions, stats) is called after each stored page.
+    Returns the number of revisions fetched.
+    """
+    since_revision_id, cursor = resume_point(conn, article_title)
+
+    total = 0
+    for revisions in iter_revision_pages(article_title, since_revision_id=since_revision_id, cursor=cursor):
+        stats = update_database(conn, article_title, revisions)
+        save_checkpoint(conn, article_title, since_revision_id, cursor, revisions)
+        total += len(revisions)
+        if on_page:
+            on_page(revisions, stats)
+    clear_checkpoint(conn, article_title)
+    return total
+
+def find_changed_articles(conn, titles):
+    """
+    Return the subset of titles that were edited since their newest stored
+    revision, probing prop=info for up to 50 titles per request and
+    comparing each lastrevid with our MAX(revision_id). Titles that cannot
+    be confirmed as unchanged are returned too, and so are titles with a
+    pending checkpoint: their stored head says nothing about the backfill.
+    """
+    titles = list(dict.fromkeys(titles))
+    stored = {}
+    for i in range(0, len(titles), SQL_IN_CHUNK_SIZE):
+        chunk = titles[i:i + SQL_IN_CHUNK_SIZE]
+        for row in conn.execute(f"""
+            SELECT a.title, MAX(r.revision_id) AS last_revision_id
+            FROM articles a
+            JOIN revisions r ON r.article_id = a.id
+            WHERE a.title IN ({','.join('?' * len(chunk))})
+            GROUP BY a.id
+        """, chunk):
+            stored[row[0]] = row[1]
+        for row in conn.execute(f"""
+            SELECT title FROM ingest_checkpoints
+            WHERE title IN ({','.join('?' * len(chunk))})
+        """, chunk):
+            stored.pop(row[0], None)
+
+    changed = set(title for title in titles if title not in stored)
+    to_probe = [title for title in titles if title in stored]
+    for i in range(0, len(to_probe), TITLES_PER_REQUEST):
+        batch = to_probe[i:i + TITLES_PER_REQUEST]
+        data = api_get({
+            "action": "query",
+            "prop": "info",
+            "titles": "|".join(batch),
+            "formatversion": "2"
+        }, endpoint='info')
+        query = data.get("query", {})
+        # Map the normalized titles of the answer back to ours
+        original = {n["to"]: n["from"] for n in query.get("normalized", [])}
+        last_revision_ids = {
+            original.get(page.get("title"), page.get("title")): page.get("lastrevid")
+            for page in query.get("pages", [])
+        }
+        for title in batch:
+            lastrevid = last_revision_ids.get(title)
+            if lastrevid is None or lastrevid > stored[title]:
+                changed.add(title)
+
+    print(f"[find_changed_articles] {len(changed)} articles modifiés sur {len(titles)}")
+    return changed
+
+def populate_articles(db_path, titles, max_workers=POPULATE_WORKERS):
+    """
+    Populate several articles concurrently. A pool of worker threads pages
+    through the API while the calling thread is the single writer: it owns
+    the only database connection and stores pages as they arrive. Every
+    article gets a row in population_runs, and successful scheduled ones get
+    their last_populated updated. Returns the runs keyed by title.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    # Bounded so fast fetchers wait for the writer instead of piling up pages
+    pages = queue.Queue(maxsize=max_workers * 2)
+    failed = set()
+    runs = {}
+    for title in dict.fromkeys(titles):
+        since_revision_id, cursor = resume_point(conn, title)
+        runs[title] = {
+            'since_revision_id': since_revision_id,
+            'cursor': cursor,
+            'started_at': None,
+            'revisions_fetched': 0,
+            'revisions_inserted': 0,
+            'error': None,
+        }
+
+    # The priority class is per thread, the fetchers take the caller's
+    priority = current_priority()
+
+    def fetch(title):
+        runs[title]['started_at'] = datetime.now()
+        start = time.monotonic()
+        error = None
+        try:
+            cursor = runs[title]['cursor']
+            with request_priority(priority):
+                for revisions in iter_revision_pages(title, since_revision_id=runs[title]['since_revision_id'], cursor=cursor):
+                    if title in failed:
+                        break
+                    # The writer checkpoints the position this page ends at
+                    pages.put((title, (revisions, dict(cursor))))
+        except Exception as e:
+            error = str(e)
+        pages.put((title, {'error': error, 'duration': time.monotonic() - start}))
 
-def rescrape_users(conn):
-    """Rescrape all users older than 7 days"""
-    one_week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for title in runs:
+                executor.submit(fetch, title)
+
+            remaining = len(runs)
+            try:
+                while remaining:
+                    title, item = pages.get()
+                    run = runs[title]
+
+                    if isinstance(item, dict):
+                        # End of this article's stream
+                        remaining -= 1
+                        run['error'] = run['error'] or item['error']
+                        run['duration'] = item['duration']
+                        if not run['error']:
+                            clear_checkpoint(conn, title)
+                        _record_population_run(conn, title, run)
+                        status = 'Erreur' if run['error'] else 'OK'
+                        print(f"[populate_articles] {title}: {status} en {run['duration']:.1f}s, {run['revisions_fetched']} révisions.")
+                        continue
+
+                    if title in failed:
+                        continue
+                    revisions, cursor = item
+                    try:
+                        stats = update_database(conn, title, revisions)
+                        save_checkpoint(conn, title, run['since_revision_id'], cursor, revisions)
+                        run['revisions_fetched'] += len(revisions)
+                        run['revisions_inserted'] += stats['inserted'] if stats else 0
+                    except Exception as e:
+                        conn.rollback()
+                        failed.add(title)
+                        run['error'] = str(e)
+            except BaseException:
+                # Fetchers may be blocked on the full queue: stop them and
+                # drain it until every article has sent its end marker, or
+                # the executor would wait for them forever
+                failed.update(runs)
+                while remaining:
+                    _, item = pages.get()
+                    if isinstance(item, dict):
+                        remaining -= 1
+                raise
+    finally:
+        conn.close()
+
+    return runs
+
+def _record_population_run(conn, title, run):
+    """Store the outcome of one article population and mark it as populated."""
+    conn.execute("""
+        INSERT INTO population_runs
+        (title, started_at, finished_at, duration_seconds, status, revisions_fetched, revisions_inserted, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        title,
+        run['started_at'].isoformat() if run['started_at'] else None,
+        datetime.now().isoformat(),
+        run['duration'],
+        'error' if run['error'] else 'success',
+        run['revisions_fetched'],
+        run['revisions_inserted'],
+        run['error']
+    ))
+    if not run['error']:
+        conn.execute(
+            "UPDATE scheduled_articles SET last_populated = datetime('now') WHERE title = ?",
+            (title,)
+        )
+    conn.commit()
+
+def rescrape_users(conn, batch_size=USERS_PER_REQUEST, time_budget=RESCRAPE_TIME_BUDGET):
+    """
+    Rescrape users older than 7 days, most recently active editors first.
+    Users are refreshed batch_size at a time (one list=users call each) and
+    committed per batch. The run stops once time_budget seconds are spent;
+    refreshed users are no longer stale, so the next run resumes where this
+    one stopped.
+    """
+    one_week_ago = int(time.time()) - 7 * SECONDS_PER_DAY
+    deadline = time.monotonic() + time_budget if time_budget else None
     
-    users_to_rescrape = conn.execute("""
-        SELECT username FROM users 
-        WHERE last_updated IS NULL OR last_updated < ?
-        ORDER BY last_updated ASC NULLS FIRST
-    """, (one_week_ago,)).fetchall()
+    # Last activity from user_stats, maintained by the triggers
+    users_to_rescrape = [row['username'] for row in conn.execute("""
+        SELECT u.username
+        FROM users u
+        LEFT JOIN user_stats us ON us.user_id = u.id
+        WHERE u.last_updated_epoch IS NULL OR u.last_updated_epoch < ?
+        ORDER BY us.last_edit_epoch DESC NULLS LAST, u.last_updated_epoch ASC NULLS FIRST
+    """, (one_week_ago,)).fetchall()]
+    print(f"[rescrape_users] {len(users_to_rescrape)} utilisateurs à mettre à jour")
     
-    for user in users_to_rescrape:
-        username = user['username']
-        print(f"[rescrape_users] Mise à jour des informations pour {username}")
-        
-        user_info = get_user_info(username)
-        now = datetime.now().isoformat()
+    refreshed = 0
+    for batch in _api_batches(users_to_rescrape, batch_size):
+        if deadline and time.monotonic() >= deadline:
+            print(f"[rescrape_users] Budget de {time_budget}s écoulé, reprise au prochain passage")
+            break
+
+        try:
+            infos = get_users_info(batch)
+        except Exception as e:
+            # Leave the users stale so the next run retries them
+            print(f"[rescrape_users] Error fetching user info: {str(e)}")
+            break
+        now = datetime.now()
         
-        conn.execute("""
+        conn.executemany("""
             UPDATE users 
             SET is_bot = ?,
                 is_ip = ?,
                 is_blocked = ?,
                 user_id = ?,
                 last_updated = ?,
+                last_updated_epoch = ?,
                 is_scraped = 1
             WHERE username = ?
-        """, (
-            int(user_info.get('is_bot', False)),
-            int(user_info.get('is_ip', False)),
-            int(user_info.get('is_blocked', False)),
-            user_info.get('user_id'),
-            now,
-            username
-        ))
+        """, [
+            (
+                int(infos[username].get('is_bot', False)),
+                int(infos[username].get('is_ip', False)),
+                int(infos[username].get('is_blocked', False)),
+                infos[username].get('user_id'),
+                now.isoformat(),
+                int(now.timestamp()),
+                username
+            )
+            for username in batch
+        ])
+        conn.commit()
+        refreshed += len(batch)
     
-    conn.commit()
-    return len(users_to_rescrape)
+    print(f"[rescrape_users] {refreshed} utilisateurs mis à jour")
+    return refreshed
+
+def _api_batches(usernames, batch_size):
+    """
+    Split usernames in order into batches holding batch_size names that need
+    the API; IPs are resolved locally and ride along for free.
+    """
+    batch = []
+    queried = 0
+    for username in usernames:
+        batch.append(username)
+        if username and not _is_ip(username):
+            queried += 1
+            if queried == batch_size:
+                yield batch
+                batch = []
+                queried = 0
+    if batch:
+        yield batch
 
 def get_user_info(username):
     """Récupère bot/ip/bloqué via API ou détection IP"""
     print(f"[get_user_info] Analyse de {username}")
+    return get_users_info([username])[username]
+
+def _default_user_info(is_ip=False):
+    return {'is_ip': is_ip, 'is_bot': False, 'is_blocked': False, 'user_id': None}
 
+def _is_ip(username):
     try:
         ipaddress.ip_address(username)
-        return {'is_ip': True, 'is_bot': False, 'is_blocked': False, 'user_id': None}
+        return True
     except ValueError:
-        pass
-    
-    # Handle None or empty username
-    if not username:
-        return {'is_ip': False, 'is_bot': False, 'is_blocked': False, 'user_id': None}
+        return False
 
-    api_url = "https://fr.wikipedia.org/w/api.php"
-    params = {
-        'action': 'query',
-        'list': 'users',
-        'ususers': username,
-        'usprop': 'groups|blockinfo|userid',
-        'format': 'json'
-    }
+def get_users_info(usernames):
+    """
+    Récupère bot/ip/bloqué pour plusieurs utilisateurs.
+    IPs are detected locally; registered accounts are queried through
+    list=users with up to USERS_PER_REQUEST names per call.
+    Returns a dict mapping each username to its info.
+    """
+    infos = {}
+    to_query = []
+    for username in dict.fromkeys(usernames):
+        # Handle None or empty username
+        if not username:
+            infos[username] = _default_user_info()
+        elif _is_ip(username):
+            infos[username] = _default_user_info(is_ip=True)
+        else:
+            to_query.append(username)
 
-    try:
-        resp = requests.get(api_url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        # Handle case where API returns no users
-        users = data.get('query', {}).get('users', [])
-        if not users:
-            return {'is_ip': False, 'is_bot': False, 'is_blocked': False, 'user_id': None}
-            
-        user = users[0]
-        
-        # Handle missing or invalid users
-        if user.get('missing') or user.get('invalid'):
-            return {'is_ip': False, 'is_bot': False, 'is_blocked': False, 'user_id': None}
-        
-        return {
-            'is_ip': False,
-            'is_bot': 'bot' in user.get('groups', []) or username.lower().endswith('bot'),
-            'is_blocked': 'blockid' in user,
-            'user_id': user.get('userid')
+    for i in range(0, len(to_query), USERS_PER_REQUEST):
+        batch = to_query[i:i + USERS_PER_REQUEST]
+        print(f"[get_users_info] Requête API pour {len(batch)} utilisateurs")
+        params = {
+            'action': 'query',
+            'list': 'users',
+            'ususers': '|'.join(batch),
+            'usprop': 'groups|blockinfo|userid'
         }
-        
-    except Exception as e:
-        print(f"[get_user_info] Error fetching user info: {str(e)}")
-        return {'is_ip': False, 'is_bot': False, 'is_blocked': False, 'user_id': None}
-    
-def update_database(conn, article_title, revisions):
+        # Failures propagate: defaults would be stored as if they were scraped
+        data = api_get(params, endpoint='users')
+
+        # The API answers with normalized names, map them back to ours
+        normalized = {
+            n['to']: n['from'] for n in data.get('query', {}).get('normalized', [])
+        }
+        for user in data.get('query', {}).get('users', []):
+            name = normalized.get(user.get('name'), user.get('name'))
+            # Handle missing or invalid users
+            if name not in batch or user.get('missing') or user.get('invalid'):
+                continue
+            infos[name] = {
+                'is_ip': False,
+                'is_bot': 'bot' in user.get('groups', []) or name.lower().endswith('bot'),
+                'is_blocked': 'blockid' in user,
+                'user_id': user.get('userid')
+            }
+
+        for username in batch:
+            infos.setdefault(username, _default_user_info())
+
+    return infos
+
+def _db_key(cur):
+    """Identify the database file behind a cursor, to keep caches per database."""
+    return cur.execute("PRAGMA database_list").fetchone()[2]
+
+def _is_fresh(last_updated):
+    return bool(last_updated) and (datetime.now() - datetime.fromisoformat(last_updated)).days < 7
+
+def resolve_user_ids(cur, usernames, scrape=True):
+    """
+    Map usernames to local users.id, scraping the unknown or stale ones.
+    Users already scraped less than 7 days ago are reused as is: first from
+    the in-process cache, then with one IN (...) query per chunk. All the
+    others are resolved with batched API calls and upserted in bulk.
+    With scrape=False no API call is made: known users are reused whatever
+    their age and unknown ones are inserted unscraped (IPs detected
+    locally), for rescrape_users to complete later.
+    """
+    db_key = _db_key(cur)
+    user_ids = {}
+    to_lookup = []
+    for username in dict.fromkeys(usernames):
+        cached = _user_id_cache.get((db_key, username))
+        if cached and _is_fresh(cached[1]):
+            user_ids[username] = cached[0]
+        else:
+            to_lookup.append(username)
+
+    to_scrape = []
+    for i in range(0, len(to_lookup), SQL_IN_CHUNK_SIZE):
+        chunk = to_lookup[i:i + SQL_IN_CHUNK_SIZE]
+        rows = cur.execute(f"""
+            SELECT id, username, is_scraped, last_updated FROM users
+            WHERE username IN ({','.join('?' * len(chunk))})
+        """, chunk).fetchall()
+        known = {row['username']: row for row in rows}
+        for username in chunk:
+            user_row = known.get(username)
+            if user_row and not scrape:
+                user_ids[username] = user_row['id']
+            elif user_row and user_row['is_scraped'] == 1 and _is_fresh(user_row['last_updated']):
+                user_ids[username] = user_row['id']
+                _user_id_cache[(db_key, username)] = (user_row['id'], user_row['last_updated'])
+            else:
+                to_scrape.append(username)
+
+    if to_scrape and not scrape:
+        cur.executemany("""
+            INSERT INTO users (username, is_ip, is_bot, is_blocked, is_scraped)
+            VALUES (?, ?, 0, 0, 0)
+            ON CONFLICT(username) DO NOTHING
+        """, [(username, int(_is_ip(username))) for username in to_scrape])
+        for i in range(0, len(to_scrape), SQL_IN_CHUNK_SIZE):
+            chunk = to_scrape[i:i + SQL_IN_CHUNK_SIZE]
+            rows = cur.execute(f"""
+                SELECT id, username FROM users
+                WHERE username IN ({','.join('?' * len(chunk))})
+            """, chunk).fetchall()
+            for row in rows:
+                user_ids[row['username']] = row['id']
+        return user_ids, 0
+
+    if to_scrape:
+        infos = get_users_info(to_scrape)
+        scraped_at = datetime.now()
+        now = scraped_at.isoformat()
+        # Insert new users or update existing ones (if they weren't scraped before).
+        cur.executemany("""
+            INSERT INTO users (username, is_ip, is_bot, is_blocked, user_id, is_scraped, last_updated, last_updated_epoch)
+            VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(username) DO UPDATE SET
+                is_ip = excluded.is_ip,
+                is_bot = excluded.is_bot,
+                is_blocked = excluded.is_blocked,
+                user_id = excluded.user_id,
+                is_scraped = 1,
+                last_updated = excluded.last_updated,
+                last_updated_epoch = excluded.last_updated_epoch;
+        """, [
+            (
+                username,
+                int(infos[username].get('is_ip', False)),
+                int(infos[username].get('is_bot', False)),
+                int(infos[username].get('is_blocked', False)),
+                infos[username].get('user_id'), # This can be None
+                now,
+                int(scraped_at.timestamp())
+            )
+            for username in to_scrape
+        ])
+
+        # Fetch the local ids after the upsert, lastrowid is unreliable for updates
+        for i in range(0, len(to_scrape), SQL_IN_CHUNK_SIZE):
+            chunk = to_scrape[i:i + SQL_IN_CHUNK_SIZE]
+            rows = cur.execute(f"""
+                SELECT id, username FROM users
+                WHERE username IN ({','.join('?' * len(chunk))})
+            """, chunk).fetchall()
+            for row in rows:
+                user_ids[row['username']] = row['id']
+                _user_id_cache[(db_key, row['username'])] = (row['id'], now)
+
+    return user_ids, len(to_scrape)
+
+def update_database(conn, article_title, revisions, chunk_size=REVISION_CHUNK_SIZE, scrape_users=True):
     """
     Insert article and revision data into the database.
     Optimized to skip scraping user details if already marked as scraped.
+    Revisions are written with executemany, chunk_size rows per transaction.
+    scrape_users=False stores new editors without any API call (offline import).
+    Returns the inserted/ignored counts, with the detail of every chunk.
     """
     cur = conn.cursor()
 
@@ -260,96 +839,52 @@ def update_database(conn, article_title, revisions):
         return
     article_id = article_id_row["id"]
 
-    users_api_called_count = 0
-    users_skipped_api_count = 0
-    revisions_inserted_count = 0
-    revisions_ignored_count = 0
+    # Resolve every distinct editor of this batch at once
+    usernames = [rev.get("user") for rev in revisions if rev.get("user")]
+    user_ids, users_api_called_count = resolve_user_ids(cur, usernames, scrape=scrape_users)
+    users_skipped_api_count = len(user_ids) - users_api_called_count
+    conn.commit()
 
+    rows = []
     for rev in revisions:
         username = rev.get("user")
         if not username:  # Skip if no username
             print(f"[update_database] Skipping revision_id {rev.get('revision_id')} due to missing username.")
             continue
-            
-        user_id = None # This is the local DB user.id
-        
-        # Check if user exists and is already scraped
-        cur.execute("SELECT id, is_scraped, last_updated FROM users WHERE username = ?", (username,))
-        user_row = cur.fetchone()
-
-        if user_row and user_row['is_scraped'] == 1 and user_row['last_updated']:
-            last_updated = datetime.fromisoformat(user_row['last_updated'])
-            if (datetime.now() - last_updated).days < 7:
-                user_id = user_row['id']
-                # print(f"[update_database] User '{username}' (ID: {user_id}) already scraped. Skipping API call.")
-                users_skipped_api_count += 1
-        else:
-            # User not found, or found but not marked as scraped.
-            # if user_row: # User exists but is_scraped = 0 or NULL
-            # print(f"[update_database] User '{username}' (ID: {user_row['id']}) found but not scraped. Calling API.")
-            # else: # User not found
-            # print(f"[update_database] User '{username}' not found in DB. Calling API.")
-            
-            user_info = get_user_info(username) # Actual API call
-            users_api_called_count +=1
-            now = datetime.now().isoformat()
-            
-            # Insert new user or update existing user (if they weren't scraped before).
-            # Set is_scraped = 1 in both cases.
-            # Using standard "UPSERT" syntax.
-            cur.execute("""
-                INSERT INTO users (username, is_ip, is_bot, is_blocked, user_id, is_scraped, last_updated)
-                VALUES (?, ?, ?, ?, ?, 1, ?)
-                ON CONFLICT(username) DO UPDATE SET
-                    is_ip = excluded.is_ip,
-                    is_bot = excluded.is_bot,
-                    is_blocked = excluded.is_blocked,
-                    user_id = excluded.user_id,
-                    is_scraped = 1,
-                    last_updated = excluded.last_updated;
-            """, (
-                username, 
-                int(user_info.get('is_ip', False)), 
-                int(user_info.get('is_bot', False)), 
-                int(user_info.get('is_blocked', False)),
-                user_info.get('user_id'), # This can be None
-                now
-            ))
-            
-            # Fetch the user_id (local DB id) after insert/update
-            # This is necessary because `ON CONFLICT DO UPDATE` might not return `lastrowid` predictably
-            # for updates, and even for inserts, explicit select is safer.
-            cur.execute("SELECT id FROM users WHERE username = ?", (username,))
-            user_result = cur.fetchone()
-            if user_result:
-                user_id = user_result["id"]
-            else:
-                print(f"[update_database] CRITICAL: Failed to retrieve ID for user '{username}' after DB operation. Skipping revision.")
-                continue
-        
-        if not user_id: # Should have been caught above, but as a final safeguard
+
+        user_id = user_ids.get(username) # This is the local DB user.id
+        if not user_id:
             print(f"[update_database] Error: User ID for '{username}' could not be resolved. Skipping revision_id {rev.get('revision_id')}.")
             continue
 
-        # Insert revision
-        # INSERT OR IGNORE handles duplicate revision_ids (unique constraint on revision_id)
-        cur.execute("""
-            INSERT OR IGNORE INTO revisions
-            (revision_id, article_id, user_id, timestamp, comment, parent_id, is_scraped, flags, size_change, tags)
-            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
-        """, (
+        ts_epoch = epoch_seconds(rev["timestamp"])
+        rows.append((
             rev["revision_id"], article_id, user_id, rev["timestamp"],
+            ts_epoch, day_bucket(ts_epoch),
             rev["comment"], rev.get("parent_id"),
             rev.get("flags"), rev.get("size_change"), rev.get("tags")
         ))
 
-        if cur.rowcount > 0: # rowcount is 1 if a row was inserted, 0 if ignored
-            revisions_inserted_count += 1
-        else:
-            revisions_ignored_count += 1
+    stats = {'inserted': 0, 'ignored': 0, 'chunks': []}
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        # One transaction per chunk; INSERT OR IGNORE handles duplicate
+        # revision_ids (unique constraint on revision_id)
+        with conn:
+            cur.executemany("""
+                INSERT OR IGNORE INTO revisions
+                (revision_id, article_id, user_id, timestamp, ts_epoch, day, comment, parent_id, is_scraped, flags, size_change, tags)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+            """, chunk)
+        # rowcount sums the rows actually inserted by executemany
+        inserted = cur.rowcount
+        chunk_stats = {'inserted': inserted, 'ignored': len(chunk) - inserted}
+        stats['chunks'].append(chunk_stats)
+        stats['inserted'] += chunk_stats['inserted']
+        stats['ignored'] += chunk_stats['ignored']
+        print(f"[update_database] Chunk {len(stats['chunks'])}: {chunk_stats['inserted']} inserted, {chunk_stats['ignored']} ignored.")
 
-    conn.commit() # Commit once after processing all revisions for the article
-    
     print(f"[update_database] Finished processing for article '{article_title}'.")
-    print(f"[update_database] User API calls made: {users_api_called_count}. User API calls skipped: {users_skipped_api_count}.")
-    print(f"[update_database] Revisions newly inserted: {revisions_inserted_count}. Revisions ignored (already exist): {revisions_ignored_count}.")
\ No newline at end of file
+    print(f"[update_database] Users scraped via API: {users_api_called_count}. Users already up to date: {users_skipped_api_count}.")
+    print(f"[update_database] Revisions newly inserted: {stats['inserted']}. Revisions ignored (already exist): {stats['ignored']}.")
+    return stats
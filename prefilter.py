@@ -0,0 +1,136 @@
+import math
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from prompt_budget import line_weight, split_hunks
+
+# Local pre-filter run before the LLM in analyze_top_contributors. Many top
+# contributors only fix typos, categorise, add interwikis or reformat: they
+# are labelled 'neutre' here, with a confidence, and never reach the LLM.
+# Two signals per user:
+# - technical ratio: share of revisions that are maintenance edits (edit
+#   comment, boilerplate-only diff, or a near-identical rewrite);
+# - topic signal: TF-IDF weight of the conflict lexicon in the user's edit
+#   comments and changed lines, document frequencies taken over the users
+#   scored so far in the run.
+# Only users that are clearly technical and off-topic are auto-labelled.
+
+# Minimum share of maintenance revisions
+PREFILTER_TECHNICAL_RATIO = float(os.getenv("PREFILTER_TECHNICAL_RATIO", 0.8))
+# Maximum topic signal (0..1)
+PREFILTER_MAX_TOPIC_SIGNAL = float(os.getenv("PREFILTER_MAX_TOPIC_SIGNAL", 0.2))
+# Minimum confidence to skip the LLM, above 1 disables the pre-filter
+PREFILTER_MIN_CONFIDENCE = float(os.getenv("PREFILTER_MIN_CONFIDENCE", 0.7))
+# Topic TF-IDF mass at which the topic signal saturates to 1
+TOPIC_TFIDF_SATURATION = 0.03
+# Removed/added text at least this similar is a typo or formatting fix
+MINOR_EDIT_RATIO = 0.95
+# Longer rewrites are not compared character by character
+MINOR_EDIT_MAX_CHARS = 5000
+
+PREFILTER_MODEL = "prefilter"
+
+# Accent-folded, lowercase stems
+TOPIC_STEMS = (
+    "israel", "palestin", "gaza", "hamas", "tsahal", "cisjordan", "colonis", "colonie",
+    "apartheid", "genocid", "sionis", "antisemit", "intifada", "hezbollah", "otage",
+    "terroris", "jerusalem", "netanyahou", "nakba", "occupation", "fatah", "massacre",
+    "refugie", "blocus", "kibboutz", "judee", "samarie", "shoah", "jihad",
+)
+
+TECHNICAL_COMMENT_RE = re.compile(
+    r"typo|orthograph|coquille|faute|ponctuation|espace|mise en (forme|page)|wikif|"
+    r"cat[ée]gor|interwiki|homonymie|portail|[ée]bauche|maintenance|\bliens?\b|"
+    r"format|accent|majuscule|modèle|infobox|redirect|"
+    r"correction|\bcorr\b|retouche|mineur|\bbot\b|wstat|checkwiki",
+    re.I
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def _fold(text):
+    """Lowercase without accents, 'Israël' -> 'israel'."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def _is_topic_term(word):
+    return word.startswith(TOPIC_STEMS)
+
+def is_technical_revision(rev):
+    """A maintenance edit: by its comment, or by what its diff changes."""
+    if TECHNICAL_COMMENT_RE.search(rev.get('comment') or ''):
+        return True
+
+    hunks = split_hunks(rev.get('diff', ''))
+    if not hunks:
+        # No text change is maintenance, a page creation is not
+        return rev.get('diff', '').startswith("[Aucun changement")
+    if all(line_weight(line) < 1 for _, line in hunks):
+        # Only categories, templates, infobox parameters, refs...
+        return True
+
+    added = "".join(line for kind, line in hunks if kind == 'added')
+    removed = "".join(line for kind, line in hunks if kind == 'removed')
+    if not added or not removed or max(len(added), len(removed)) > MINOR_EDIT_MAX_CHARS:
+        return False
+    return SequenceMatcher(None, removed, added).ratio() >= MINOR_EDIT_RATIO
+
+def user_terms(revisions):
+    """Folded words of the edit comments and changed lines of a user."""
+    words = []
+    for rev in revisions:
+        words.extend(_WORD_RE.findall(_fold(rev.get('comment') or '')))
+        for _, line in split_hunks(rev.get('diff', '')):
+            words.extend(_WORD_RE.findall(_fold(line)))
+    return words
+
+def score_user(revisions, doc_freq):
+    """
+    Signals and confidence of one user. doc_freq ({'_docs': n, term: df})
+    is updated with this user before scoring, so the IDF covers every user
+    seen so far in the run.
+    """
+    words = user_terms(revisions)
+    topic_counts = {}
+    for word in words:
+        if _is_topic_term(word):
+            topic_counts[word] = topic_counts.get(word, 0) + 1
+
+    doc_freq['_docs'] = doc_freq.get('_docs', 0) + 1
+    for term in topic_counts:
+        doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    # Smoothed IDF, always >= 1
+    docs = doc_freq['_docs']
+    tfidf = sum(
+        count / len(words) * (math.log((1 + docs) / (1 + doc_freq[term])) + 1)
+        for term, count in topic_counts.items()
+    ) if words else 0.0
+    topic_signal = min(1.0, tfidf / TOPIC_TFIDF_SATURATION)
+
+    technical = sum(1 for rev in revisions if is_technical_revision(rev))
+    technical_ratio = technical / len(revisions) if revisions else 0.0
+
+    return {
+        'technical_ratio': technical_ratio,
+        'topic_signal': topic_signal,
+        'confidence': technical_ratio * (1 - topic_signal),
+    }
+
+def prefilter_user(revisions, doc_freq):
+    """
+    (classification, response) for a clearly technical user, None when the
+    user must go to the LLM.
+    """
+    scores = score_user(revisions, doc_freq)
+    if (scores['technical_ratio'] < PREFILTER_TECHNICAL_RATIO
+            or scores['topic_signal'] > PREFILTER_MAX_TOPIC_SIGNAL
+            or scores['confidence'] < PREFILTER_MIN_CONFIDENCE):
+        return None
+    return 'neutre', (
+        "Classification: neutre\n"
+        f"Justification: pré-filtre local, contributions techniques "
+        f"({scores['technical_ratio']:.0%} de révisions de maintenance, "
+        f"signal thématique {scores['topic_signal']:.2f}, confiance {scores['confidence']:.2f})"
+    )
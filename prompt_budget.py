@@ -0,0 +1,87 @@
+import math
+import re
+
+# Token-budgeted selection of diff excerpts for the classifier prompts.
+# Diff lines (hunks) of all the revisions of a user compete for one budget:
+# each is scored, prose up and wiki boilerplate (infobox parameters,
+# references, categories, files...) down, repeated lines are kept once,
+# and hunks are taken by decreasing score (weight x sqrt of their
+# informative length) as long as they fit in the remaining budget. Ranking
+# by score per token instead would favour trivially short lines.
+
+# Tokens of diff excerpts per user
+PROMPT_TOKEN_BUDGET = 2500
+# A single line is cut to this many characters (huge template lines)
+MAX_HUNK_CHARS = 600
+
+_HUNK_RE = re.compile(r"<span class='(added|removed)'>(.*?)</span>", re.S)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Inline references and templates do not count as informative text
+_INLINE_NOISE_RE = re.compile(r"<ref[^>/]*>.*?</ref>|<ref[^>]*/>|\{\{[^{}]*\}\}", re.S)
+
+# (pattern, weight) of a diff line, the first match wins
+_NOISE = [
+    (re.compile(r"^\s*$"), 0.0),
+    (re.compile(r"^\s*\|"), 0.3),                                    # infobox / table parameters
+    (re.compile(r"^\s*(\{\{|\}\})"), 0.3),                           # templates
+    (re.compile(r"^\s*\[\[(Catégorie|Category|Fichier|File|Image):", re.I), 0.2),
+    (re.compile(r"^\s*<ref[ >]", re.I), 0.3),
+    (re.compile(r"^\s*(==+|\*\s*\[http|<!--)"), 0.5),               # headings, bare links, comments
+]
+
+def estimate_tokens(text):
+    """
+    Local stand-in for the tokenizer: one token per punctuation mark and
+    about one per four characters of word, close enough to size prompts.
+    """
+    return sum(math.ceil(len(token) / 4) for token in _TOKEN_RE.findall(text))
+
+def line_weight(line):
+    """Informativeness weight of a diff line: 0 for blank lines, <1 for wiki boilerplate."""
+    for pattern, weight in _NOISE:
+        if pattern.search(line):
+            return weight
+    # Prose: mostly letters, few markup characters
+    markup = sum(line.count(c) for c in "{}[]|=<>")
+    return 1.5 if markup <= len(line) / 20 else 1.0
+
+def _normalize(line):
+    return " ".join(line.lower().split())
+
+def split_hunks(diff):
+    """[(kind, line)] of a generate_diff output, kind 'added' or 'removed'."""
+    return [(kind, line) for kind, line in _HUNK_RE.findall(diff)]
+
+def pack_diffs(revisions, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Choose the diff lines to show for each revision within `budget` tokens.
+    Returns one excerpt per revision (same order), in the generate_diff
+    HTML format, or "" when none of its lines made it.
+    """
+    candidates = []
+    seen = set()
+    for index, rev in enumerate(revisions):
+        for position, (kind, line) in enumerate(split_hunks(rev.get('diff', ''))):
+            key = _normalize(line)
+            if key in seen:
+                continue
+            seen.add(key)
+            weight = line_weight(line)
+            if weight == 0:
+                continue
+            line = line[:MAX_HUNK_CHARS]
+            text = f"<span class='{kind}'>{line}</span>"
+            tokens = estimate_tokens(text)
+            # Informative length, with diminishing returns on long lines
+            score = weight * math.sqrt(len(_INLINE_NOISE_RE.sub("", key)))
+            candidates.append((score, index, position, text, tokens))
+
+    chosen = {}
+    spent = 0
+    for score, index, position, text, tokens in sorted(candidates, key=lambda c: c[0], reverse=True):
+        if spent + tokens > budget:
+            continue
+        chosen.setdefault(index, []).append((position, text))
+        spent += tokens
+
+    return ["".join(text for _, text in sorted(chosen.get(index, []))) for index in range(len(revisions))]
@@ -1,33 +1,109 @@
-def fetch_revisions_db(conn, article_title, limit=25, page=1):
-    offset = (page - 1) * limit
-    cur = conn.cursor()
-    cur.execute("""
+import base64
+import json
+import time
+from migrations import SECONDS_PER_DAY
+
+# Listings page with keyset (cursor) pagination: a page starts right after
+# the sort key of the last row shown instead of skipping OFFSET rows, so
+# every page costs the same as the first. Cursors are opaque URL-safe
+# tokens holding the direction and the sort key of the boundary row.
+
+def encode_cursor(direction, key):
+    raw = json.dumps([direction, key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """(direction, key) of a token, (None, None) when absent or invalid."""
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, key = json.loads(raw)
+    except (ValueError, TypeError):
+        return None, None
+    if direction not in ('next', 'prev') or not isinstance(key, list):
+        return None, None
+    return direction, key
+
+def _keyset_page(conn, query, params, keys, limit, cursor, descending=True):
+    """
+    Run one page of `query`, which must contain a {keyset} placeholder
+    right after its WHERE/HAVING conditions, an {order} placeholder and a
+    final LIMIT ?. `keys` are (sql expression, result column) pairs, the
+    last one unique. Returns (rows, next_cursor, prev_cursor).
+    """
+    direction, values = decode_cursor(cursor)
+    if values is not None and len(values) != len(keys):
+        direction, values = None, None
+    backwards = direction == 'prev'
+
+    keyset = ""
+    if direction:
+        after = (direction == 'next') == descending
+        keyset = f"AND ({', '.join(expr for expr, _ in keys)}) {'<' if after else '>'} ({', '.join('?' * len(keys))})"
+        params = list(params) + values
+    ascending = descending == backwards
+    order = "ORDER BY " + ", ".join(f"{expr} {'ASC' if ascending else 'DESC'}" for expr, _ in keys)
+
+    rows = conn.execute(query.format(keyset=keyset, order=order), list(params) + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+
+    has_next = True if backwards else more
+    has_prev = more if backwards else direction is not None
+    next_cursor = encode_cursor('next', [rows[-1][column] for _, column in keys]) if has_next else None
+    prev_cursor = encode_cursor('prev', [rows[0][column] for _, column in keys]) if has_prev else None
+    return rows, next_cursor, prev_cursor
+
+def fetch_revisions_db(conn, article_title, limit=25, cursor=None):
+    """Revisions of an article, newest first. Returns (rows, next_cursor, prev_cursor)."""
+    return _keyset_page(conn, """
         SELECT r.revision_id, r.parent_id, r.timestamp, r.comment, 
                r.flags, r.size_change, r.tags, u.username
         FROM revisions r
+        JOIN users u ON u.id = r.user_id
+        WHERE r.article_id = (SELECT id FROM articles WHERE title = ?)
+        {keyset}
+        {order}
+        LIMIT ?
+    """, [article_title], [("r.timestamp", "timestamp"), ("r.revision_id", "revision_id")], limit, cursor)
+
+def fetch_user_revisions(conn, user_id, limit=25, cursor=None):
+    """Revisions of a user, newest first. Returns (rows, next_cursor, prev_cursor)."""
+    return _keyset_page(conn, """
+        SELECT r.revision_id, r.parent_id, r.timestamp, r.comment, 
+               a.title as article_title, u.username
+        FROM revisions r
         JOIN articles a ON a.id = r.article_id
         JOIN users u ON u.id = r.user_id
-        WHERE a.title = ?
-        ORDER BY r.timestamp DESC
-        LIMIT ? OFFSET ?
-    """, (article_title, limit, offset))
-    return cur.fetchall()
+        WHERE r.user_id = ?
+        {keyset}
+        {order}
+        LIMIT ?
+    """, [user_id], [("r.timestamp", "timestamp"), ("r.revision_id", "revision_id")], limit, cursor)
 
-def fetch_users(conn, article_title=None, bots_only=False, ips_only=False,
-                blocked_only=False, active_within_days=None, limit=25, page=1, sort='contributions'):
-    """Fetch filtered user list from DB."""
-    offset = (page - 1) * limit
+def _users_source(article_title, bots_only, ips_only, blocked_only, active_within_days):
+    """
+    FROM/WHERE shared by fetch_users and count_users. Counts come from the
+    user_stats aggregates (user_article_stats when filtered on an article),
+    kept up to date by triggers, so no revision is scanned.
+    """
     params = []
     filters = []
-    joins = ""
-    order_by = ""
+    source = """
+        FROM users u
+        JOIN user_stats us ON us.user_id = u.id
+    """
 
     if article_title:
-        joins += """
-            JOIN revisions r ON r.user_id = u.id
-            JOIN articles a ON a.id = r.article_id
+        source += """
+            JOIN user_article_stats s ON s.user_id = u.id
+            AND s.article_id = (SELECT id FROM articles WHERE title = ?)
         """
-        filters.append("a.title = ?")
         params.append(article_title)
 
     if bots_only:
@@ -38,91 +114,64 @@ def fetch_users(conn, article_title=None, bots_only=False, ips_only=False,
         filters.append("u.is_blocked = 1")
 
     if active_within_days:
-        joins += " JOIN revisions rev2 ON rev2.user_id = u.id"
-        filters.append("rev2.timestamp >= datetime('now', ?)")
-        params.append(f"-{active_within_days} days")
-    
-    # Add sorting logic
-    if sort == 'contributions':
-        order_by = "ORDER BY contributions DESC"
-    elif sort == 'newest':
-        order_by = "ORDER BY last_edit DESC"
-        joins += " LEFT JOIN (SELECT user_id, MAX(timestamp) as last_edit FROM revisions GROUP BY user_id) le ON le.user_id = u.id"
+        filters.append("us.last_edit_epoch >= ?")
+        params.append(int(time.time()) - active_within_days * SECONDS_PER_DAY)
+
+    where_clause = f"WHERE {' AND '.join(filters or ['1 = 1'])}"
+    return f"{source} {where_clause}", params
+
+def fetch_users(conn, article_title=None, bots_only=False, ips_only=False,
+                blocked_only=False, active_within_days=None, limit=25, cursor=None, sort='contributions'):
+    """Fetch filtered user list from DB. Returns (rows, next_cursor, prev_cursor)."""
+    source, params = _users_source(article_title, bots_only, ips_only, blocked_only, active_within_days)
+    # Contributions and last activity on the article when filtered on one
+    stats = "s" if article_title else "us"
+    descending = True
+
+    # Sorting logic, the user id breaks ties
+    if sort == 'newest':
+        sort_key = "COALESCE(us.last_edit, '')"
     elif sort == 'oldest':
-        order_by = "ORDER BY first_edit ASC"
-        joins += " LEFT JOIN (SELECT user_id, MIN(timestamp) as first_edit FROM revisions GROUP BY user_id) fe ON fe.user_id = u.id"
-    
-    params.extend([limit, offset])
+        sort_key = "COALESCE(us.first_edit, '')"
+        descending = False
+    else:
+        sort_key = f"{stats}.contributions"
 
     query = f"""
             SELECT u.id, u.username, u.is_ip, u.is_bot, u.is_blocked, 
-                COUNT(DISTINCT rev.id) AS contributions,
-                MAX(rev.timestamp) AS last_activity, u.classification
-            FROM users u
-            {joins}
-            LEFT JOIN revisions rev ON rev.user_id = u.id
-            {f"AND rev.article_id = a.id" if article_title else ""}
-            {f"WHERE {' AND '.join(filters)}" if filters else ""}
-            GROUP BY u.id
-            {order_by}
-            LIMIT ? OFFSET ?
+                {stats}.contributions AS contributions,
+                {stats}.last_edit AS last_activity, u.classification,
+                {sort_key} AS sort_key
+            {source}
+            {{keyset}}
+            {{order}}
+            LIMIT ?
             """
-
-    cur = conn.cursor()
-    return cur.execute(query, params).fetchall()
+    # Tie-break on the stats table's own user_id, which its indexes carry
+    keys = [(sort_key, "sort_key"), (f"{stats}.user_id", "id")]
+    return _keyset_page(conn, query, params, keys, limit, cursor, descending)
 
 def count_users(conn, article_title=None, bots_only=False, ips_only=False,
                blocked_only=False, active_within_days=None):
     """Count total users for pagination"""
-    params = []
-    filters = []
-    joins = ""
-
     # Same filter logic as fetch_users
-    if article_title:
-        joins += """
-            JOIN revisions r ON r.user_id = u.id
-            JOIN articles a ON a.id = r.article_id
-        """
-        filters.append("a.title = ?")
-        params.append(article_title)
-
-    if bots_only:
-        filters.append("u.is_bot = 1")
-    if ips_only:
-        filters.append("u.is_ip = 1")
-    if blocked_only:
-        filters.append("u.is_blocked = 1")
-
-    if active_within_days:
-        joins += " JOIN revisions r2 ON r2.user_id = u.id"
-        filters.append("r2.timestamp >= datetime('now', ?)")
-        params.append(f"-{active_within_days} days")
-
-    where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
-    
-    query = f"""
-        SELECT COUNT(DISTINCT u.id)
-        FROM users u
-        {joins}
-        {where_clause}
-    """
-
+    source, params = _users_source(article_title, bots_only, ips_only, blocked_only, active_within_days)
     cur = conn.cursor()
-    return cur.execute(query, params).fetchone()[0]
+    return cur.execute(f"SELECT COUNT(*) {source}", params).fetchone()[0]
 
-def fetch_articles(conn, limit=25, page=1):
-    offset = (page - 1) * limit
-    cur = conn.cursor()
-    cur.execute("""
+def fetch_articles(conn, limit=25, cursor=None):
+    """Articles, most recently changed first. Returns (rows, next_cursor, prev_cursor)."""
+    return _keyset_page(conn, """
         SELECT a.id, a.title, 
                COUNT(r.id) AS nb_revisions,
                COUNT(DISTINCT r.user_id) AS nb_users,
-               MAX(r.timestamp) AS last_change
+               MAX(r.timestamp) AS last_change,
+               COALESCE(MAX(r.timestamp), '') AS sort_key
         FROM articles a
         LEFT JOIN revisions r ON r.article_id = a.id
         GROUP BY a.id
-        ORDER BY last_change DESC
-        LIMIT ? OFFSET ?
-    """, (limit, offset))
-    return cur.fetchall()
+        HAVING 1 = 1
+        {keyset}
+        {order}
+        LIMIT ?
+    """, [], [("COALESCE(MAX(r.timestamp), '')", "sort_key"), ("a.id", "id")], limit, cursor)
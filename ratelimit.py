@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide token bucket for the MediaWiki API. The bucket state lives in
+# a small SQLite file so every thread and every process of the application
+# (web workers, scheduler, scripts) draws from the same budget.
+
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "ratelimit.db")
+# Requests per second, 0 disables the limiter
+RATE = float(os.getenv("WIKI_API_RATE", "10"))
+BURST = float(os.getenv("WIKI_API_BURST", "20"))
+
+# Priority classes, lower is more urgent
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+# Tokens a class must leave in the bucket for the classes above it, so that
+# interactive requests find tokens even while background jobs saturate it
+RESERVED_TOKENS = {INTERACTIVE: 0, NORMAL: 2, BACKGROUND: 5}
+
+# Longest single sleep, so waiters re-check the bucket and the queue often
+MAX_SLEEP = 0.5
+
+_local = threading.local()
+_waiting = {INTERACTIVE: 0, NORMAL: 0, BACKGROUND: 0}
+_waiting_lock = threading.Lock()
+
+@contextmanager
+def request_priority(priority):
+    """Run the API calls of the enclosed block in the given priority class."""
+    previous = getattr(_local, 'priority', NORMAL)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+def current_priority():
+    return getattr(_local, 'priority', NORMAL)
+
+def _connect():
+    conn = sqlite3.connect(RATE_LIMIT_DB, timeout=30, isolation_level=None)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS token_bucket (
+            name TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def _take_token(conn, needed, bucket):
+    """
+    Refill the bucket and take one token if at least `needed` are available.
+    Returns 0 on success, otherwise the seconds to wait before retrying.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM token_bucket WHERE name = ?", (bucket,)
+        ).fetchone()
+        tokens = BURST if row is None else min(BURST, row[0] + max(0.0, now - row[1]) * RATE)
+
+        wait = 0.0
+        if tokens >= needed:
+            tokens -= 1
+        else:
+            wait = (needed - tokens) / RATE
+
+        conn.execute("""
+            INSERT INTO token_bucket (name, tokens, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+        """, (bucket, tokens, now))
+        conn.execute("COMMIT")
+        return wait
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def acquire(priority=None, bucket="mediawiki"):
+    """
+    Block until the caller may send one API request. Requests of a lower
+    priority class also wait while a more urgent one is queued in this
+    process. Returns the time spent waiting, in seconds.
+    """
+    if RATE <= 0:
+        return 0.0
+    if priority is None:
+        priority = current_priority()
+    # Never ask for more than the bucket can hold
+    needed = min(1 + RESERVED_TOKENS.get(priority, 0), BURST)
+
+    start = time.monotonic()
+    with _waiting_lock:
+        _waiting[priority] += 1
+    conn = _connect()
+    try:
+        while True:
+            with _waiting_lock:
+                yield_to_urgent = any(count for p, count in _waiting.items() if p < priority)
+            if yield_to_urgent:
+                time.sleep(1 / RATE)
+                continue
+
+            wait = _take_token(conn, needed, bucket)
+            if not wait:
+                return time.monotonic() - start
+            time.sleep(min(wait, MAX_SLEEP))
+    finally:
+        conn.close()
+        with _waiting_lock:
+            _waiting[priority] -= 1
@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+from jobs import enqueue_job
+from populate import update_database
+from ratelimit import BACKGROUND
+from wikiapi import api_get
+
+# Ingest every tracked article from one list=recentchanges feed instead of
+# polling each title. The feed position is persisted in feed_cursors, so
+# each poll only reads the edits made since the previous one.
+# The feed only extends a stored history: a change is written when its
+# parent is the newest stored revision of the article. Anything else (edits
+# made before the first poll or while the poller was down, changes the feed
+# does not report) leaves a gap, and the article is queued for a normal
+# delta population instead.
+
+FEED_NAME = "recentchanges"
+# Pages of up to 500 changes read per poll, the rest waits for the next one
+RC_MAX_PAGES = 50
+
+def load_cursor(conn, name=FEED_NAME):
+    return conn.execute(
+        "SELECT rcstart, rccontinue FROM feed_cursors WHERE name = ?", (name,)
+    ).fetchone()
+
+def save_cursor(conn, rcstart, rccontinue, name=FEED_NAME):
+    conn.execute("""
+        INSERT INTO feed_cursors (name, rcstart, rccontinue, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            rcstart = excluded.rcstart,
+            rccontinue = excluded.rccontinue,
+            updated_at = excluded.updated_at
+    """, (name, rcstart, rccontinue, datetime.now().isoformat()))
+
+def tracked_heads(conn):
+    """
+    Articles the feed may update, with the id of their newest stored
+    revision. Scheduled articles never populated are left out, they need a
+    full backfill first. Articles with a pending checkpoint map to None:
+    their backfill must resume before anything is appended.
+    """
+    heads = {row[0]: row[1] for row in conn.execute("""
+        SELECT a.title, MAX(r.revision_id)
+        FROM articles a
+        JOIN revisions r ON r.article_id = a.id
+        GROUP BY a.id
+    """)}
+    for row in conn.execute("SELECT title FROM ingest_checkpoints"):
+        if row[0] in heads:
+            heads[row[0]] = None
+    return heads
+
+def _change_to_revision(change):
+    """Convert a recentchanges entry into the dict update_database expects."""
+    raw_timestamp = change.get("timestamp")
+    old_size = change.get("oldlen")
+    new_size = change.get("newlen")
+    return {
+        "revision_id": change.get("revid"),
+        "parent_id": change.get("old_revid"),
+        "timestamp": raw_timestamp.replace('T', ' ').replace('Z', '') if raw_timestamp else None,
+        "user": change.get("user"),
+        "comment": change.get("comment", ""),
+        "flags": "minor" if change.get("minor") else "",
+        "size": new_size,
+        "parent_size": old_size,
+        # Page creations have no parent, like the first revision of a history
+        "size_change": new_size - old_size if change.get("type") == "edit" and None not in (old_size, new_size) else None,
+        "tags": ','.join(change.get('tags', []))
+    }
+
+def poll_recent_changes(conn, max_pages=RC_MAX_PAGES):
+    """
+    Read the main-namespace edits made since the stored cursor and write the
+    ones extending a tracked article through update_database. Articles with
+    a change that does not follow their newest stored revision get a
+    population job. The cursor is saved with each page, so an interrupted
+    poll resumes where it stopped. On the very first run the cursor is only
+    initialised to now. Returns the number of revisions routed to the database.
+    """
+    cursor = load_cursor(conn)
+    if cursor is None:
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        save_cursor(conn, now, None)
+        conn.commit()
+        print(f"[poll_recent_changes] Curseur initialisé à {now}")
+        return 0
+
+    rcstart, rccontinue = cursor[0], cursor[1]
+    heads = tracked_heads(conn)
+    # Articles left to their population job for the rest of this poll
+    gaps = set()
+    params = {
+        "action": "query",
+        "list": "recentchanges",
+        "rcnamespace": "0",
+        "rctype": "edit|new",
+        "rcdir": "newer",
+        "rcstart": rcstart,
+        "rclimit": "max",
+        "rcprop": "title|ids|sizes|flags|user|comment|timestamp|tags",
+        "formatversion": "2",
+        "continue": ""
+    }
+    if rccontinue:
+        params.update({"rccontinue": rccontinue, "continue": "-||"})
+
+    routed = 0
+    for _ in range(max_pages):
+        data = api_get(params, endpoint='recentchanges')
+        changes = data.get("query", {}).get("recentchanges", [])
+
+        by_title = {}
+        queued = []
+        for change in changes:
+            title, revid = change.get("title"), change.get("revid")
+            if title not in heads or title in gaps or not revid:
+                continue
+            head = heads[title]
+            if head is not None and revid <= head:
+                # Already stored by a population
+                continue
+            if head is None or change.get("old_revid") != head:
+                gaps.add(title)
+                queued.append(title)
+                continue
+            by_title.setdefault(title, []).append(_change_to_revision(change))
+            heads[title] = revid
+        for title, revisions in by_title.items():
+            update_database(conn, title, revisions)
+            routed += len(revisions)
+        for title in queued:
+            # Catching up like a scheduled population, behind the users' requests
+            job_id, _ = enqueue_job(conn, title, BACKGROUND)
+            print(f"[poll_recent_changes] Historique incomplet pour '{title}', population delta (job {job_id})")
+
+        if changes:
+            rcstart = changes[-1]["timestamp"]
+        rccontinue = data.get("continue", {}).get("rccontinue")
+        save_cursor(conn, rcstart, rccontinue)
+        conn.commit()
+        print(f"[poll_recent_changes] {len(changes)} modifications lues, {sum(map(len, by_title.values()))} sur des articles suivis")
+
+        if not rccontinue:
+            break
+        params.update(data["continue"])
+
+    return routed
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Local store for revision wikitext. Revision content never changes, so
+# once downloaded it is kept here, zlib-compressed, in a side SQLite file.
+# Texts are content-addressed: revisions are mapped to the SHA-1 of their
+# text and identical texts (reverts, restored versions) are stored once.
+# The store is capped in size and evicts the least recently used revisions.
+# Its compressed size is kept up to date in store_meta by triggers, so a
+# write does not read the whole store to know whether to evict.
+
+REVISION_CACHE_PATH = os.getenv("REVISION_CACHE_PATH", "revision_cache.db")
+# Compressed bytes kept before evicting, 512 MB by default
+REVISION_CACHE_MAX_BYTES = int(os.getenv("REVISION_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Eviction frees space down to this share of the cap, not just one entry
+EVICTION_TARGET = 0.9
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+def _get_conn():
+    """One connection per thread, created with the schema on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(REVISION_CACHE_PATH, timeout=30)
+        conn.executescript("""
+        CREATE TABLE IF NOT EXISTS revision_index (
+            revid INTEGER PRIMARY KEY,
+            sha1 TEXT NOT NULL,
+            last_access REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS content_blobs (
+            sha1 TEXT PRIMARY KEY,
+            content BLOB NOT NULL,
+            size INTEGER NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_revision_index_access ON revision_index(last_access);
+        CREATE INDEX IF NOT EXISTS idx_revision_index_sha1 ON revision_index(sha1);
+
+        CREATE TABLE IF NOT EXISTS store_meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+
+        -- Stores created before store_meta are summed once
+        INSERT OR IGNORE INTO store_meta (name, value)
+        SELECT 'bytes', COALESCE(SUM(size), 0) FROM content_blobs
+        WHERE NOT EXISTS (SELECT 1 FROM store_meta WHERE name = 'bytes');
+
+        CREATE TRIGGER IF NOT EXISTS trg_content_blobs_insert AFTER INSERT ON content_blobs
+        BEGIN
+            UPDATE store_meta SET value = value + NEW.size WHERE name = 'bytes';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_content_blobs_delete AFTER DELETE ON content_blobs
+        BEGIN
+            UPDATE store_meta SET value = value - OLD.size WHERE name = 'bytes';
+        END;
+        """)
+        _local.conn = conn
+    return conn
+
+def _count(hits, misses):
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+def get_contents(revids):
+    """Return {revid: text} for the requested revisions found in the store."""
+    revids = list(dict.fromkeys(revids))
+    if not revids:
+        return {}
+    conn = _get_conn()
+    found = {}
+    # Stay well under SQLite's bound parameter limit
+    for i in range(0, len(revids), 500):
+        chunk = revids[i:i + 500]
+        rows = conn.execute(f"""
+            SELECT r.revid, b.content
+            FROM revision_index r
+            JOIN content_blobs b ON b.sha1 = r.sha1
+            WHERE r.revid IN ({','.join('?' * len(chunk))})
+        """, chunk).fetchall()
+        for revid, content in rows:
+            found[revid] = zlib.decompress(content).decode('utf-8')
+
+    if found:
+        now = time.time()
+        conn.executemany(
+            "UPDATE revision_index SET last_access = ? WHERE revid = ?",
+            [(now, revid) for revid in found]
+        )
+        conn.commit()
+    _count(len(found), len(revids) - len(found))
+    return found
+
+def put_contents(contents):
+    """Store {revid: text}, then evict old entries if the cap is exceeded."""
+    if not contents:
+        return
+    conn = _get_conn()
+    now = time.time()
+    for revid, text in contents.items():
+        raw = text.encode('utf-8')
+        sha1 = hashlib.sha1(raw).hexdigest()
+        if conn.execute("SELECT 1 FROM content_blobs WHERE sha1 = ?", (sha1,)).fetchone() is None:
+            compressed = zlib.compress(raw, 6)
+            conn.execute(
+                "INSERT OR IGNORE INTO content_blobs (sha1, content, size) VALUES (?, ?, ?)",
+                (sha1, compressed, len(compressed))
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO revision_index (revid, sha1, last_access) VALUES (?, ?, ?)",
+            (revid, sha1, now)
+        )
+    conn.commit()
+    _evict(conn)
+
+def _stored_bytes(conn):
+    return conn.execute("SELECT value FROM store_meta WHERE name = 'bytes'").fetchone()[0]
+
+def _evict(conn, max_bytes=None):
+    """Drop the least recently used revisions until the store fits its cap."""
+    max_bytes = max_bytes or REVISION_CACHE_MAX_BYTES
+    total = _stored_bytes(conn)
+    if total <= max_bytes:
+        return
+
+    target = max_bytes * EVICTION_TARGET
+    while total > target:
+        # Oldest revisions first, just enough of them to get under the target
+        victims = []
+        to_free = total - target
+        for revid, size in conn.execute("""
+            SELECT r.revid, b.size
+            FROM revision_index r
+            JOIN content_blobs b ON b.sha1 = r.sha1
+            ORDER BY r.last_access
+        """):
+            victims.append((revid,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        if not victims:
+            break
+        conn.executemany("DELETE FROM revision_index WHERE revid = ?", victims)
+        # Blobs still shared with a kept revision stay
+        conn.execute("""
+            DELETE FROM content_blobs
+            WHERE NOT EXISTS (SELECT 1 FROM revision_index r WHERE r.sha1 = content_blobs.sha1)
+        """)
+        total = _stored_bytes(conn)
+    conn.commit()
+    print(f"[revision_store] Éviction LRU, {total} octets conservés")
+
+def cache_stats():
+    """Hit/miss counters of this process and the current size of the store."""
+    conn = _get_conn()
+    entries, = conn.execute("SELECT COUNT(*) FROM revision_index").fetchone()
+    blobs, = conn.execute("SELECT COUNT(*) FROM content_blobs").fetchone()
+    size = _stored_bytes(conn)
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'revisions': entries,
+        'blobs': blobs,
+        'bytes': size,
+    }
@@ -0,0 +1,109 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from ratelimit import acquire
+
+# Shared HTTP client for every MediaWiki API call of the application.
+# One keep-alive session, retries with exponential backoff on 429/5xx and
+# network errors, Retry-After and maxlag support, per-endpoint timeouts.
+# Every attempt goes through the global rate limiter (see ratelimit.py).
+
+API_URL = os.getenv("WIKI_API_URL", "https://fr.wikipedia.org/w/api.php")
+USER_AGENT = "Wikiparse/1.0 (https://github.com/AronMaa/Wikiparse)"
+
+# Ask the API to refuse requests when replication lag exceeds this (seconds)
+MAXLAG = 5
+MAX_RETRIES = 5
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Timeouts in seconds by kind of request, content requests are the heaviest
+TIMEOUTS = {
+    'revisions': 30,
+    'content': 30,
+    'contribs': 15,
+    'recentchanges': 15,
+    'users': 10,
+    'info': 10,
+    'default': 15,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+class WikiAPIError(Exception):
+    """Raised when the MediaWiki API keeps failing or returns an error."""
+
+def get_session():
+    """Return the process-wide keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept-Encoding": "gzip",
+            })
+            _session = session
+        return _session
+
+def _retry_delay(attempt, retry_after=None):
+    """Seconds to wait before the next attempt, Retry-After taking precedence."""
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) + random.uniform(0, 1)
+
+def api_get(params, endpoint='default', timeout=None):
+    """
+    Send a GET query to the MediaWiki API and return the decoded JSON.
+    Transient failures are retried; raises WikiAPIError once retries are
+    exhausted or when the API answers with an error.
+    """
+    params = {"format": "json", "maxlag": MAXLAG, **params}
+    timeout = timeout or TIMEOUTS.get(endpoint, TIMEOUTS['default'])
+    session = get_session()
+
+    last_error = None
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(delay)
+        acquire()
+
+        try:
+            resp = session.get(API_URL, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = str(e)
+            delay = _retry_delay(attempt)
+            print(f"[api_get] Erreur réseau ({last_error}), nouvelle tentative dans {delay:.1f}s")
+            continue
+
+        if resp.status_code in RETRY_STATUSES:
+            last_error = f"HTTP {resp.status_code}"
+            delay = _retry_delay(attempt, resp.headers.get("Retry-After"))
+            print(f"[api_get] {last_error}, nouvelle tentative dans {delay:.1f}s")
+            continue
+        resp.raise_for_status()
+
+        data = resp.json()
+        error = data.get("error")
+        if error and error.get("code") == "maxlag":
+            # Replicas are lagging: back off for as long as the API asks
+            last_error = error.get("info", "maxlag")
+            delay = _retry_delay(attempt, resp.headers.get("Retry-After") or MAXLAG)
+            print(f"[api_get] Lag serveur ({last_error}), nouvelle tentative dans {delay:.1f}s")
+            continue
+        if error:
+            raise WikiAPIError(f"{error.get('code')}: {error.get('info')}")
+        return data
+
+    raise WikiAPIError(f"Échec après {MAX_RETRIES + 1} tentatives: {last_error}")